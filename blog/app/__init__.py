@@ -1,43 +1,87 @@
 from flask import Flask, render_template
 from flask_mail import Mail
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from config import config
 from flask_migrate import Migrate
 from flask_login import LoginManager
-from flask_datepicker import datepicker
-from flask_wtf.csrf import CSRFProtect
 from flask_uploads import UploadSet, IMAGES, configure_uploads
-from flask_images import Images
-from flask_socketio import SocketIO
+from .presence import PresenceTracker
+from .identity import IdentityCache
+from .search import SearchIndex
+from .thumbnails import Thumbnailer
+from .outbox import Outbox
+from .chat import MessageBuffer
+from .fragments import FragmentCache
+from .hashing import PasswordHasher
+from .tokens import TokenService
+from .metrics import Metrics
+from .concurrency import Concurrency
+from .lazy import LazyExtension
+from .routing import RoutingSQLAlchemy
 
 
-images = Images()
 uploads = UploadSet('images', IMAGES)
 mail = Mail()
-moment = Moment()
-db = SQLAlchemy(session_options={"autoflush": False})
+moment = LazyExtension('flask_moment.Moment')
+db = RoutingSQLAlchemy(session_options={"autoflush": False})
 login_manager = LoginManager()
-csrf = CSRFProtect()
-socket_io = SocketIO()
+csrf = LazyExtension('flask_wtf.csrf.CSRFProtect')
+socket_io = LazyExtension('flask_socketio.SocketIO')
 migrate = Migrate()
+presence = PresenceTracker()
+identity = IdentityCache()
+search = SearchIndex()
+thumbnails = Thumbnailer()
+outbox = Outbox()
+chat = MessageBuffer()
+fragments = FragmentCache()
+passwords = PasswordHasher()
+tokens = TokenService()
+metrics = Metrics()
+concurrency = Concurrency()
 login_manager.login_view = 'auth.login'
 
 
-def create_app(config_name):
+def create_app(config_name, web=True):
+    """Builds the application, without the views and web-only extensions when web is False.
+
+    CLI commands only need the models, the database and the services they
+    run, leaving the views out keeps every flask command quick to start.
+    """
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
     mail.init_app(app)
-    moment.init_app(app)
-    datepicker(app)
+    outbox.init_app(app)
     configure_uploads(app, uploads)
     db.init_app(app)
     migrate.init_app(app, db)
-    images.init_app(app)
+    thumbnails.init_app(app)
+    fragments.init_app(app)
+    passwords.init_app(app)
+    tokens.init_app(app)
+    presence.init_app(app)
+    identity.init_app(app)
+    search.init_app(app)
+    concurrency.init_app(app)
+    if web:
+        _init_web_app(app, config[config_name])
+    return app
+
+
+def _init_web_app(app, app_config):
+    from flask_datepicker import datepicker
+    from .socket.broker import message_queue_options
+    from .concurrency import async_mode
+
+    app_config.init_web_app(app)
+    metrics.init_app(app)
+    moment.init_app(app)
+    datepicker(app)
     login_manager.init_app(app)
     csrf.init_app(app)
-    socket_io.init_app(app)
+    socket_io.init_app(app, async_mode=async_mode(), **message_queue_options(app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SECRET_KEY'],
+                                                                             app.config['SOCKETIO_BROKER_ALLOW_REMOTE']))
+    chat.init_app(app)
 
     from .main import main as main_blueprint
     app.register_blueprint(main_blueprint)
@@ -50,5 +94,3 @@ def create_app(config_name):
 
     from .socket import socket as socket_blueprint
     app.register_blueprint(socket_blueprint, url_prefix='/socket')
-
-    return app
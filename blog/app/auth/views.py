@@ -2,11 +2,12 @@ from . import auth
 from flask import render_template, request, flash, redirect, url_for, current_app
 from .forms import LoginForm, RegistrationForm, ResetPasswordForm, ForgotPasswordForm, EditProfileForm, EditUserForm
 from ..models import User, Post
-from .. import db
+from .. import db, identity, passwords, tokens
 from ..utils import send_mail
 from flask_login import login_user, logout_user, login_required, current_user
 from sqlalchemy import or_
-from ..decorators import admin_required
+from ..decorators import admin_required, replica
+from ..pagination import KeysetPagination
 from datetime import datetime
 
 
@@ -14,7 +15,6 @@ from datetime import datetime
 def before_request():
     if current_user.is_authenticated:
         current_user.ping()
-        db.session.commit()
 
 
 @auth.route('/login', methods=['POST', 'GET'])
@@ -23,6 +23,9 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter(or_(User.username == form.username.data, User.email == form.username.data)).first()
         if user is not None and user.check_password(form.password.data):
+            if passwords.needs_rehash(user.hashed_password):
+                user.password = form.password.data
+                db.session.commit()
             login_user(user, form.remember_me.data)
             redirect_url = request.args.get('next')
             if redirect_url is None or not redirect_url.startswith('/'):
@@ -39,7 +42,7 @@ def account_recover():
     if form.validate_on_submit():
         user = User.query.filter(or_(User.username == form.email.data, User.email == form.email.data)).first()
         if user is not None:
-            token = user.generate_token(3600)
+            token = tokens.generate('reset', user.id, 3600, single_use=True)
             send_mail(user.email, 'Resetting Password', 'auth/email/resetting.html', user=user, token=token)
 
         flash('An email has been sent. It contains a link you must click to reset your password.'
@@ -50,18 +53,21 @@ def account_recover():
 
 @auth.route('/account/reset/<string:token>', methods=['GET', 'POST'])
 def account_reset(token):
-    user_id = User.extract_token(token)
-    user = User.query.get(int(user_id)) if user_id is not None else None
+    payload = tokens.load('reset', token)
+    user = User.query.get(int(payload['reset'])) if payload is not None else None
     if user is None:
         return redirect(url_for('.account_recover'))
 
     form = ResetPasswordForm()
     if form.validate_on_submit():
+        if not tokens.consume(payload):
+            return redirect(url_for('.account_recover'))
         user.password = form.password.data
         db.session.commit()
+        identity.invalidate(user.id)
         login_user(user, False)
         flash('The password has been reset successfully')
-        return redirect(url_for('blog.index', _external=True))
+        return redirect(url_for('blog.index_posts', _external=True))
 
     return render_template('auth/reset-password-page.html', form=form, user=user)
 
@@ -105,13 +111,14 @@ def confirm(token):
     if not current_user.confirmed and current_user.check_token(token):
         current_user.confirmed = True
         db.session.commit()
+        identity.invalidate(current_user.id)
         flash('You have confirmed your account. Thanks!')
 
     if current_user.confirmed:
         return redirect(url_for('.confirmed', _external=True))
 
     flash('The confirmation link is invalid or has expired.')
-    return redirect(url_for('blog.index', _external=True))
+    return redirect(url_for('blog.index_posts', _external=True))
 
 
 @auth.route('/confirmed')
@@ -121,6 +128,7 @@ def confirmed():
 
 
 @auth.route('/profile/<string:username>')
+@replica
 @login_required
 def profile(username):
     user = User.query.filter_by(username=username).first_or_404()
@@ -138,8 +146,10 @@ def setting():
         current_user.phone = form.phone.data
         current_user.birthday = form.birthday.data
         current_user.address = form.address.data
+        current_user.version = User.version + 1
         db.session.add(current_user._get_current_object())
         db.session.commit()
+        identity.invalidate(current_user.id)
 
     form.first_name.data = current_user.first_name
     form.last_name.data = current_user.last_name
@@ -169,8 +179,10 @@ def edit_user(identifier):
         user.username = form.username.data
         if form.password.data:
             user.password = form.password.data
+        user.version = User.version + 1
         db.session.add(user)
         db.session.commit()
+        identity.invalidate(user.id)
 
     form.first_name.data = user.first_name
     form.last_name.data = user.last_name
@@ -191,7 +203,9 @@ def delete_user(identifier):
     user = User.query.get_or_404(identifier)
     if not user.is_administrator():
         user.deleted_at = datetime.utcnow()
+        user.version = User.version + 1
         db.session.commit()
+        identity.invalidate(user.id)
         flash('The given user is deleted successfully')
     else:
         flash('You can not delete an administrator')
@@ -205,7 +219,9 @@ def undelete_user(identifier):
     user = User.query.get_or_404(identifier)
     if not user.is_administrator():
         user.deleted_at = None
+        user.version = User.version + 1
         db.session.commit()
+        identity.invalidate(user.id)
         flash('The given user is un deleted successfully')
     else:
         flash('You can not delete an administrator')
@@ -217,6 +233,6 @@ def undelete_user(identifier):
 @login_required
 @admin_required
 def index_users():
-    page = request.args.get('page', 1, type=int)
-    paginator = User.query.paginate(page, per_page=current_app.config['FLASKY_USER_PER_PAGE'], error_out=True)
+    paginator = KeysetPagination(User.query, [User.id], cursor=request.args.get('cursor'), per_page=current_app.config['FLASKY_USER_PER_PAGE'],
+                                 count_key='users')
     return render_template('auth/users-page.html', users=paginator.items, paginator=paginator)
@@ -1,53 +1,112 @@
-from flask import render_template, flash, current_app, request, redirect, url_for, abort
+from flask import render_template, flash, current_app, request, redirect, url_for, abort, g
 from flask_login import login_required, current_user
 from . import blog
-from .. import db, uploads
-from ..models import Post, User, Follow, Comment, Permission
+from .. import db, uploads, timeline, search, thumbnails, fragments
+from ..models import Post, User, Follow, Comment, Permission, ContentVersion
 from .forms import PostForm, CommentForm
-from ..decorators import permission_required_in, permission_required_eq
+from ..decorators import permission_required_in, permission_required_eq, conditional_get, replica
+from ..pagination import KeysetPagination
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from os import remove
 
 
+def _posts_state():
+    return ContentVersion.current('posts')
+
+
+def _user_posts_state(username):
+    # the view renders the same user, keep it rather than loading it twice
+    g.posts_user = User.query.filter_by(username=username).first_or_404()
+    return ContentVersion.current('posts') + (g.posts_user.version,)
+
+
+def _post_state(identifier):
+    # the comment cards show their authors' names and avatars, versions only grow so their sum moves with any edit
+    commenters = db.session.query(func.coalesce(func.sum(User.version), 0)).join(Comment, Comment.author_id == User.id). \
+        filter(Comment.post_id == identifier).as_scalar()
+    state = db.session.query(Post.updated_at, Post.version, Post.comments_count, User.version, commenters). \
+        outerjoin(User, User.id == Post.author_id).filter(Post.id == identifier).first()
+    if state is None:
+        abort(404)
+    return tuple(state)
+
+
 @blog.route('/', methods=['GET', 'POST'])
+@replica
+@conditional_get(_posts_state)
 def index_posts():
-    page = request.args.get('page', 1, type=int)
-    paginator = Post.query.order_by(Post.timestamp.desc()).paginate(page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'], error_out=False)
+    paginator = KeysetPagination(Post.listing(), [Post.timestamp, Post.id], cursor=request.args.get('cursor'), descending=True,
+                                 per_page=current_app.config['FLASKY_POSTS_PER_PAGE'], count_key='posts')
     return render_template('blog/posts-page.html', posts=paginator.items, paginator=paginator)
 
 
+@blog.route('/timeline')
+@login_required
+def timeline_posts():
+    paginator = timeline.paginate(current_user, request.args.get('cursor'), current_app.config['FLASKY_POSTS_PER_PAGE'])
+    return render_template('blog/posts-page.html', posts=paginator.items, paginator=paginator, endpoint='blog.timeline_posts')
+
+
+@blog.route('/search')
+def search_posts():
+    paginator = search.search(request.args.get('q'), request.args.get('cursor'), current_app.config['FLASKY_POSTS_PER_PAGE'])
+    post_ids = {hit.post_id for hit in paginator.items}
+    posts = {post.id: post for post in Post.listing().filter(Post.id.in_(post_ids))} if post_ids else {}
+    for hit in paginator.items:
+        hit.post = posts.get(hit.post_id)
+    return render_template('blog/search-page.html', hits=[hit for hit in paginator.items if hit.post is not None], paginator=paginator,
+                           query=request.args.get('q', ''))
+
+
 @blog.route('/<string:username>/posts', methods=['GET'])
+@replica
+@conditional_get(_user_posts_state)
 def user_posts(username):
-    user = User.query.filter_by(username=username).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    paginator = Post.query.filter_by(author_id=user.id).order_by(Post.timestamp.desc()).paginate(page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'], error_out=False)
+    user = g.pop('posts_user', None) or User.query.filter_by(username=username).first_or_404()
+    paginator = KeysetPagination(Post.listing().filter_by(author_id=user.id), [Post.timestamp, Post.id], cursor=request.args.get('cursor'),
+                                 descending=True, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'])
     return render_template('blog/user-posts-page.html', user=user, posts=paginator.items, paginator=paginator)
 
 
 @blog.route('/show/post/<int:identifier>', methods=['GET', 'POST'])
+@replica
+@conditional_get(_post_state)
 def show_post(identifier):
-    post = Post.query.filter_by(id=identifier).first_or_404()
-    page = request.args.get('page', 1, type=int)
+    post = Post.query.options(joinedload(Post.author)).filter_by(id=identifier).first_or_404()
     form = CommentForm()
     if form.validate_on_submit() and current_user.can(Permission.COMMENT):
         comment = Comment(author=current_user, body=form.body.data, post=post)
         db.session.add(comment)
+        Post.increment(post.id, comments_count=1)
+        User.increment(current_user.id, comments_count=1)
         db.session.commit()
+        search.index_comment(comment)
         flash('Your comment is created')
         return redirect(url_for('.show_post', identifier=post.id, _external=True))
 
-    paginator = db.session.query(Comment).filter_by(post=post, disabled=False).paginate(page, per_page=current_app.config['FLASKY_COMMENT_PER_PAGE'], error_out=False)
-
+    paginator = _comment_paginator(post)
     return render_template('blog/show-post-page.html', form=form, post=post, comments=paginator.items, paginator=paginator)
 
 
+def _comment_paginator(post):
+    return KeysetPagination(Comment.feed(post, current_user), [Comment.timestamp, Comment.id], cursor=request.args.get('cursor'),
+                            per_page=current_app.config['FLASKY_COMMENT_PER_PAGE'])
+
+
 @blog.route('/delete/post/<int:identifier>', methods=['POST'])
 @login_required
 def delete_post(identifier):
     post = Post.query.filter_by(id=identifier).first_or_404()
     if post.is_author(current_user) or current_user.is_administrator():
 
+        timeline.remove_post(post.id)
+        comment_ids = [comment_id for comment_id, in db.session.query(Comment.id).filter_by(post_id=post.id)]
         db.session.delete(post)
+        User.increment(post.author_id, posts_count=-1)
         db.session.commit()
+        search.remove_post(post.id, comment_ids)
+        fragments.forget('post', post.id)
         if post.image_filename is not None:
             remove(uploads.path(post.image_filename))
 
@@ -69,8 +128,11 @@ def edit_post(identifier):
         post.title = form.title.data
         post.body = form.body.data
         post.image_filename = uploads.save(form.file.data)
+        thumbnails.submit(post.image_filename)
+        post.version = Post.version + 1
         flash('The post has been updated')
         db.session.commit()
+        search.index_post(post)
         return redirect(url_for('.show_post', identifier=post.id))
 
     form.title.data = post.title
@@ -86,9 +148,14 @@ def new_post():
     form = PostForm()
     if form.validate_on_submit():
         filename = uploads.save(form.file.data)
+        thumbnails.submit(filename)
         post = Post(title=form.title.data, body=form.body.data, image_filename=filename, author=current_user._get_current_object())
         db.session.add(post)
+        db.session.flush()
+        timeline.fan_out(post)
+        User.increment(current_user.id, posts_count=1)
         db.session.commit()
+        search.index_post(post)
         flash('Your Post is created')
         return redirect(url_for('.index_posts'))
 
@@ -96,29 +163,23 @@ def new_post():
 
 
 @blog.route('/followers/<string:username>')
+@replica
 @login_required
 def followers(username):
     user = User.query.filter_by(username=username).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    paginator = db.session.query(User). \
-        filter(Follow.follower_id == user.id). \
-        join(Follow, Follow.followed_id == User.id). \
-        order_by(Follow.timestamp.desc()). \
-        paginate(page, per_page=current_app.config['FLASKY_FOLLOWER_PER_PAGE'], error_out=True)
-    return render_template('blog/user-followers-page.html', user=user, followers=paginator.items, paginator=paginator)
+    paginator = KeysetPagination(Follow.query.filter_by(follower_id=user.id), [Follow.timestamp, Follow.followed_id], cursor=request.args.get('cursor'),
+                                 descending=True, per_page=current_app.config['FLASKY_FOLLOWER_PER_PAGE'])
+    return render_template('blog/user-followers-page.html', user=user, followers=[follow.followed for follow in paginator.items], paginator=paginator)
 
 
 @blog.route('/following/<string:username>')
+@replica
 @login_required
 def following(username):
     user = User.query.filter_by(username=username).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    paginator = db.session.query(User). \
-        filter(Follow.followed_id == user.id). \
-        join(Follow, Follow.follower_id == User.id). \
-        order_by(Follow.timestamp.desc()). \
-        paginate(page, per_page=current_app.config['FLASKY_FOLLOWED_PER_PAGE'], error_out=True)
-    return render_template('blog/user-following-page.html', user=user, following=paginator.items, paginator=paginator)
+    paginator = KeysetPagination(Follow.query.filter_by(followed_id=user.id), [Follow.timestamp, Follow.follower_id], cursor=request.args.get('cursor'),
+                                 descending=True, per_page=current_app.config['FLASKY_FOLLOWED_PER_PAGE'])
+    return render_template('blog/user-following-page.html', user=user, following=[follow.follower for follow in paginator.items], paginator=paginator)
 
 
 @blog.route('/follow/<string:username>')
@@ -130,6 +191,9 @@ def follow_user(username):
     if not current_user.is_following(user_to_follow):
         follow_object = Follow(follower_id=user_to_follow.id, followed_id=current_user.id)
         db.session.add(follow_object)
+        User.increment(user_to_follow.id, followers_count=1)
+        User.increment(current_user.id, following_count=1)
+        timeline.follow(current_user.id, user_to_follow)
         db.session.commit()
         flash('You are now following %s.' % username)
     else:
@@ -146,6 +210,9 @@ def un_follow_user(username):
     if current_user.is_following(user_to_un_follow):
         follow_object = Follow.query.filter_by(follower_id=user_to_un_follow.id, followed_id=current_user.id).first()
         db.session.delete(follow_object)
+        User.increment(user_to_un_follow.id, followers_count=-1)
+        User.increment(current_user.id, following_count=-1)
+        timeline.unfollow(current_user.id, user_to_un_follow.id)
         db.session.commit()
         flash('You are now not following %s.' % username)
     else:
@@ -159,19 +226,20 @@ def un_follow_user(username):
 @permission_required_in(Permission.ADMIN, Permission.MODERATE)
 def edit_comment(identifier):
     comment = Comment.query.filter_by(id=identifier).first_or_404()
-    page = request.args.get('page', 1, type=int)
     form = CommentForm()
     if form.validate_on_submit() and current_user.can(Permission.COMMENT):
         comment.body = form.body.data
         db.session.add(comment)
+        Post.increment(comment.post_id, version=1)
         db.session.commit()
+        if not comment.disabled:
+            search.index_comment(comment)
         flash('Your comment is updated')
         return redirect(url_for('.show_post', identifier=comment.post_id))
 
     form.body.data = comment.body
 
-    paginator = db.session.query(Comment).filter_by(post=comment.post, disabled=False).\
-        paginate(page, per_page=current_app.config['FLASKY_COMMENT_PER_PAGE'], error_out=False)
+    paginator = _comment_paginator(comment.post)
 
     return render_template('blog/show-post-page.html', scroll='js-comment-section', form=form, post=comment.post, comments=paginator.items,
                            paginator=paginator)
@@ -184,7 +252,9 @@ def disable_comment(identifier):
     comment = Comment.query.get_or_404(identifier)
     if not comment.disabled:
         comment.disabled = True
+        Post.increment(comment.post_id, comments_count=-1, version=1)
         db.session.commit()
+        search.remove_comment(comment.id)
         flash('This comment is disabled')
     else:
         flash('This comment is already disabled')
@@ -199,7 +269,9 @@ def enable_comment(identifier):
     comment = Comment.query.get_or_404(identifier)
     if comment.disabled:
         comment.disabled = False
+        Post.increment(comment.post_id, comments_count=1, version=1)
         db.session.commit()
+        search.index_comment(comment)
         flash('This comment is enabled')
     else:
         flash('This comment is already enabled')
@@ -0,0 +1,108 @@
+import atexit
+from datetime import datetime
+from os import getpid
+from threading import Lock
+from sqlalchemy.exc import IntegrityError, DataError
+
+
+class MessageBuffer(object):
+    """Buffers chat messages and inserts them in bulk.
+
+    Messages are broadcast as soon as they arrive but only written every
+    CHAT_FLUSH_INTERVAL seconds, or as soon as CHAT_FLUSH_SIZE are waiting,
+    with one multi-row INSERT from a Socket.IO background task. An interval
+    of 0 writes every message immediately.
+
+    When the INSERT fails the messages are written one by one: a message the
+    database rejects, say for a room deleted in the meantime, is dropped, the
+    others are kept for CHAT_FLUSH_ATTEMPTS flushes. At most
+    CHAT_BUFFER_LIMIT messages wait, the oldest are dropped beyond that.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = Lock()
+        self._pending = []
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.app is None:
+            atexit.register(self._flush_at_exit)
+        self.app = app
+        self.interval = app.config['CHAT_FLUSH_INTERVAL']
+        self.size = app.config['CHAT_FLUSH_SIZE']
+        self.max_attempts = app.config['CHAT_FLUSH_ATTEMPTS']
+        self.limit = app.config['CHAT_BUFFER_LIMIT']
+
+    def add(self, room_id, author_id, body):
+        with self._lock:
+            self._pending.append((0, {'room_id': room_id, 'author_id': author_id, 'body': body, 'timestamp': datetime.utcnow()}))
+            self._trim()
+            due = len(self._pending) >= self.size or self.interval <= 0
+            start = not due and self._pid != getpid()
+            if start:
+                self._pid = getpid()
+
+        # the writer task does not survive a fork, every worker starts its own
+        if start:
+            from . import socket_io
+            socket_io.start_background_task(self._run)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        try:
+            self._insert([message for _, message in pending])
+            return
+        except Exception:
+            self.app.logger.exception('Could not write %d chat messages, writing them one by one' % len(pending))
+
+        retry = []
+        for index, (attempts, message) in enumerate(pending):
+            try:
+                self._insert([message])
+            except (IntegrityError, DataError) as error:
+                self.app.logger.error('Dropping chat message to room %s: %s' % (message['room_id'], error))
+            except Exception:
+                # the database is unavailable rather than this message invalid, keep the rest for the next flush
+                retry = [(attempts + 1, message) for attempts, message in pending[index:]]
+                break
+
+        dropped = [message for attempts, message in retry if attempts >= self.max_attempts]
+        if dropped:
+            self.app.logger.error('Dropping %d chat messages after %d attempts' % (len(dropped), self.max_attempts))
+        with self._lock:
+            self._pending[:0] = [(attempts, message) for attempts, message in retry if attempts < self.max_attempts]
+            self._trim()
+
+    def _insert(self, messages):
+        from . import db
+        from .models import Message
+
+        with db.engine.begin() as connection:
+            connection.execute(Message.__table__.insert(), messages)
+
+    def _trim(self):
+        excess = len(self._pending) - self.limit
+        if excess > 0:
+            del self._pending[:excess]
+            self.app.logger.error('Dropping the %d oldest chat messages, the buffer is full' % excess)
+
+    def _run(self):
+        from . import socket_io
+
+        while True:
+            socket_io.sleep(self.interval)
+            with self.app.app_context():
+                self.flush()
+
+    def _flush_at_exit(self):
+        with self.app.app_context():
+            self.flush()
@@ -0,0 +1,95 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+class Concurrency(object):
+    """Watches the gevent hub of a uwsgi gevent worker for blocking calls.
+
+    A call that never yields, CPU work or I/O through an unpatched library,
+    stalls every greenlet of the worker. Once the standard library is
+    patched, a monitor thread logs each stall longer than
+    GEVENT_MAX_BLOCKING_TIME seconds with the stack that caused it and counts
+    it for the metrics. 0 disables the monitor.
+
+    wsgi.py patches before it imports the app, which the master builds
+    once and forks. PyMySQL then yields like any socket, psycopg2 needs
+    psycogreen. The monitor thread does not survive the fork, every worker
+    starts its own from the postfork hook.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self._subscribed = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_blocking_time = app.config['GEVENT_MAX_BLOCKING_TIME']
+        if not cooperative():
+            return
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            pass
+        else:
+            # psycopg2 is C, without its wait callback every query holds the hub
+            patch_psycopg()
+
+    def start(self):
+        if self.max_blocking_time and cooperative():
+            return self.monitor()
+
+    def monitor(self):
+        import gevent
+        from gevent import events
+
+        gevent.config.monitor_thread = True
+        gevent.config.max_blocking_time = self.max_blocking_time
+        if not self._subscribed:
+            events.subscribers.append(self._notify)
+            self._subscribed = True
+        return gevent.get_hub().start_periodic_monitoring_thread()
+
+    def _notify(self, event):
+        from gevent.events import EventLoopBlocked
+
+        if not isinstance(event, EventLoopBlocked):
+            return
+        # only the monitor thread writes the counters
+        self.blocked += 1
+        self.blocked_time += event.blocking_time
+        self.app.logger.warning('Event loop blocked for more than %.3fs by %s\n%s' % (
+            event.blocking_time, event.greenlet, '\n'.join(event.info)))
+
+
+def cooperative():
+    """Whether gevent has patched the standard library, as wsgi.py does in the uwsgi gevent mode."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('socket')
+
+
+def async_mode():
+    """The Socket.IO server mode, picked here rather than by engineio, which would take gevent for merely being installed."""
+    if not cooperative():
+        return 'threading'
+    return 'gevent_uwsgi' if 'uwsgi' in sys.modules else 'gevent'
+
+
+def thread_pool(max_workers):
+    # patched threads are greenlets on the hub, blocking work needs real threads
+    if cooperative():
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+        return GeventThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+def native_lock():
+    """A lock that real threads of a thread_pool can share with the hub."""
+    if cooperative():
+        from gevent.monkey import get_original
+        return get_original('threading', 'Lock')()
+    return Lock()
@@ -0,0 +1,34 @@
+from itertools import islice
+from sqlalchemy import select, func, bindparam
+from . import db, identity
+from .models import User, Post, Comment, Follow
+
+
+def recount(batch_size=10000):
+    users, posts, comments, follows = User.__table__, Post.__table__, Comment.__table__, Follow.__table__
+    _store(users, 'followers_count', _group(follows.c.follower_id), batch_size)
+    _store(users, 'following_count', _group(follows.c.followed_id), batch_size)
+    _store(users, 'posts_count', _group(posts.c.author_id), batch_size)
+    _store(users, 'comments_count', _group(comments.c.author_id), batch_size)
+    _store(posts, 'comments_count', _group(comments.c.post_id, comments.c.disabled == False), batch_size)
+    identity.clear()
+
+
+def _group(column, condition=None):
+    # one aggregate pass, correlated COUNTs would scan the child table once per parent row
+    query = select([column, func.count()]).where(column.isnot(None)).group_by(column)
+    return query.where(condition) if condition is not None else query
+
+
+def _store(table, counter, counts, batch_size):
+    # a recount is not an edit, keep posts.updated_at and the HTTP validators derived from it
+    untouched = {column.name: column for column in table.c if column.onupdate is not None}
+    db.session.execute(table.update().values({counter: 0}, **untouched))
+    rows = ({'_id': identifier, '_count': count} for identifier, count in db.session.execute(counts).fetchall())
+    update = table.update().where(table.c.id == bindparam('_id')).values({counter: bindparam('_count')}, **untouched)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        db.session.execute(update, batch)
+    db.session.commit()
@@ -1,7 +1,10 @@
 from flask_login import current_user
-from flask import abort
+from flask import abort, request, session, current_app, make_response
 from .models import Permission
+from . import db
+from datetime import datetime
 from functools import wraps
+from hashlib import sha1
 
 
 def permission_required_eq(perm):
@@ -32,6 +35,58 @@ def admin_required(func):
     return decorated_function
 
 
+def conditional_get(validators):
+    """Lets anonymous visitors and proxies revalidate a page instead of refetching it.
+
+    validators receives the view arguments and returns a tuple from cheap
+    queries whose first item is the last modification time. The ETag hashes
+    the whole tuple with the URL, and a matching If-None-Match or
+    If-Modified-Since gets a 304 before the view queries anything.
+    Last-Modified has whole seconds: it is only sent, and If-Modified-Since
+    only honoured, once the second of the last modification is over, so a
+    later write within that second cannot hide behind the same header.
+    """
+    def decorator(func):
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET' or current_user.is_authenticated or '_flashes' in session:
+                response = make_response(func(*args, **kwargs))
+                response.cache_control.private = True
+                return response
+
+            state = validators(**kwargs)
+            last_modified = state[0].replace(microsecond=0) if state[0] is not None else None
+            if last_modified is not None and last_modified >= datetime.utcnow().replace(microsecond=0):
+                last_modified = None
+            etag = sha1(repr((request.full_path, state)).encode('utf-8')).hexdigest()
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = last_modified is not None and request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+            response = current_app.response_class(status=304) if not_modified else make_response(func(*args, **kwargs))
+            response.set_etag(etag)
+            if last_modified is not None:
+                # werkzeug dates a None as now
+                response.last_modified = last_modified
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
+
+
+def replica(func):
+    """Routes the reads of GET requests to a replica until the view writes anything."""
+    @wraps(func)
+    def decorated_function(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            db.session().use_replica = True
+        return func(*args, **kwargs)
+    return decorated_function
+
+
 def _check_perm(perms):
     if isinstance(perms, list) or isinstance(perms, tuple):
         for perm in perms:
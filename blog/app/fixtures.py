@@ -1,8 +1,12 @@
-from random import randint
+from datetime import datetime, timedelta
+from itertools import islice
+from random import Random
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from faker import Faker
-from . import db
-from .models import User, Post, Comment, Permission, Role
+from flask import current_app
+from . import db, identity, counters, passwords
+from .models import User, Post, Comment, Permission, Role, ContentVersion
 
 
 def _load_roles():
@@ -34,6 +38,8 @@ def _load_roles():
     except IntegrityError:
         db.session.rollback()
 
+    identity.clear()
+
 
 def _load_admin(count=1):
     fake = Faker()
@@ -49,40 +55,82 @@ def _load_admin(count=1):
         db.session.rollback()
 
 
-def _load_users(count=100):
-    fake = Faker()
-    for _ in range(count):
-        user = User(email=fake.email(), username=fake.user_name(), confirmed=True, first_name=fake.first_name(),
-                    last_name=fake.last_name(), about_me=fake.text(), phone=fake.phone_number(),
-                    birthday=fake.past_date(), address=fake.address(), password='123456')
-        db.session.add(user)
-
-    try:
+def _load_users(count, rng, pools, password_hash, batch_size):
+    users = User.__table__
+    role_id = db.session.query(Role.id).filter_by(default=True).scalar()
+    offset = db.session.query(func.coalesce(func.max(User.id), 0)).scalar()
+    now = datetime.utcnow()
+
+    def row(index):
+        first_name, last_name = rng.choice(pools['first_names']), rng.choice(pools['last_names'])
+        username = '{0}.{1}{2}'.format(first_name, last_name, index).lower()
+        return dict(email=username + '@example.com', username=username, confirmed=True, first_name=first_name,
+                    last_name=last_name, about_me=rng.choice(pools['texts']), phone=rng.choice(pools['phones']),
+                    birthday=(now - timedelta(days=rng.randint(6570, 29200))).date(), address=rng.choice(pools['addresses']),
+                    hashed_password=password_hash, role_id=role_id, member_since=now, last_seen=now)
+
+    _insert(users, (row(offset + index + 1) for index in range(count)), batch_size)
+
+
+def _load_posts_comments(count, comments, rng, pools, batch_size):
+    posts_table, comments_table = Post.__table__, Comment.__table__
+    user_ids = [user_id for user_id, in db.session.query(User.id)]
+    if not user_ids:
+        return
+
+    # ids are assigned here so that comments can point at posts without reading them back
+    first_post = db.session.query(func.coalesce(func.max(Post.id), 0)).scalar() + 1
+    now = datetime.utcnow()
+
+    def timestamp():
+        return now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+
+    def post(identifier):
+        created = timestamp()
+        return dict(id=identifier, image_filename=None, title=rng.choice(pools['sentences']), body=rng.choice(pools['texts']),
+                    timestamp=created, updated_at=created, author_id=rng.choice(user_ids))
+
+    def comment():
+        return dict(body=rng.choice(pools['texts']), disabled=False, timestamp=timestamp(),
+                    author_id=rng.choice(user_ids), post_id=rng.randint(first_post, first_post + count - 1))
+
+    _insert(posts_table, (post(first_post + index) for index in range(count)), batch_size)
+    if count:
+        _insert(comments_table, (comment() for _ in range(comments)), batch_size)
+
+
+def _pools(fake, size=1000):
+    return {
+        'first_names': [fake.first_name() for _ in range(size)],
+        'last_names': [fake.last_name() for _ in range(size)],
+        'phones': [fake.phone_number() for _ in range(size)],
+        'addresses': [fake.address() for _ in range(size)],
+        'sentences': [fake.sentence() for _ in range(size)],
+        'texts': [fake.text() for _ in range(size)],
+    }
+
+
+def _insert(table, rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        db.session.execute(table.insert(), batch)
         db.session.commit()
-    except IntegrityError:
-        db.session.rollback()
 
 
-def _load_posts_comments(count=100):
+def exec_fixtures(users=100, posts=100, comments=400, seed=None, password='123456', password_hash=None, batch_size=10000):
+    rng = Random(seed)
     fake = Faker()
-    user_count = User.query.count()
-    for _ in range(count):
-        user = User.query.offset(randint(0, user_count - 1)).first()
-        post = Post(image_filename=None, title=fake.sentence(), body=fake.text(), timestamp=fake.past_date(),
-                    author=user)
-        db.session.add(post)
-        for _ in range(4):
-            comment = Comment(author=User.query.offset(randint(0, user_count - 1)).first(), post=post, body=fake.text())
-            db.session.add(comment)
-
-    try:
-        db.session.commit()
-    except IntegrityError:
-        db.session.rollback()
-
+    fake.seed_instance(seed)
+    pools = _pools(fake)
 
-def exec_fixtures():
     _load_roles()
     _load_admin()
-    _load_users()
-    _load_posts_comments()
+    _load_users(users, rng, pools, password_hash or passwords.hash(password, current_app.config['FIXTURES_PASSWORD_HASH_METHOD']), batch_size)
+    _load_posts_comments(posts, comments, rng, pools, batch_size)
+    counters.recount()
+    # the Core inserts bypass the mapper events that keep the listing version
+    ContentVersion.bump(db.session.connection(), 'posts')
+    db.session.commit()
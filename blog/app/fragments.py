@@ -0,0 +1,136 @@
+import os
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+from flask import render_template
+from markupsafe import Markup
+
+
+class FragmentCache(object):
+    """Caches rendered template fragments of posts, comments and users.
+
+    A key is the template plus a tuple such as ('post', id, version,
+    author version); editing an entity bumps its version, so stale fragments
+    are never looked up again and simply age out. Fragments live in an LRU
+    dict of FRAGMENT_CACHE_SIZE entries, backed by files in FRAGMENT_CACHE_DIR
+    when it is set so that workers share what one of them rendered. The files
+    are named after their entity so that forget removes them too, and the
+    least recently read ones are evicted once the directory grows over
+    FRAGMENT_CACHE_DIR_SIZE bytes.
+    """
+
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._fragments = OrderedDict()
+        self._directory_bytes = None
+        self.hits = self.shared_hits = self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.size = app.config['FRAGMENT_CACHE_SIZE']
+        self.directory = app.config['FRAGMENT_CACHE_DIR']
+        self.directory_size = app.config['FRAGMENT_CACHE_DIR_SIZE']
+        self._directory_bytes = None
+        self.clear()
+        app.add_template_global(self.render, 'cached_fragment')
+
+    def render(self, template, key, **context):
+        key = (template,) + tuple(key)
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return fragment
+
+        fragment = self._read(key)
+        if fragment is not None:
+            self.shared_hits += 1
+        else:
+            self.misses += 1
+            fragment = Markup(render_template(template, **context))
+            self._write(key, fragment)
+
+        with self._lock:
+            self._fragments[key] = fragment
+            if len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def forget(self, entity, identifier):
+        with self._lock:
+            for key in [key for key in self._fragments if key[1:3] == (entity, identifier)]:
+                del self._fragments[key]
+        if not self.directory:
+            return
+        prefix = '%s-%s-' % (entity, identifier)
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.startswith(prefix)]
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._directory_bytes = None
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'shared_hits': self.shared_hits, 'misses': self.misses, 'size': len(self._fragments)}
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s-%s-%s.html' % (key[1], key[2], sha1(repr(key).encode('utf-8')).hexdigest()))
+
+    def _read(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as stream:
+                return Markup(stream.read())
+        except OSError:
+            return None
+
+    def _write(self, key, fragment):
+        if not self.directory:
+            return
+        path = self._path(key)
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        # the shared tier is only a cache, a full or unwritable directory leaves the fragment in memory
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, 'w', encoding='utf-8') as stream:
+                stream.write(fragment)
+            os.replace(temporary, path)
+            self._evict(os.path.getsize(path))
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+
+    def _evict(self, added):
+        # other workers write to the directory as well, the running total is only trusted up to the limit
+        with self._lock:
+            if self._directory_bytes is not None:
+                self._directory_bytes += added
+                if self._directory_bytes <= self.directory_size:
+                    return
+
+            entries = sorted((stat.st_atime, stat.st_size, entry.path)
+                             for entry, stat in ((entry, entry.stat()) for entry in os.scandir(self.directory) if entry.name.endswith('.html')))
+            self._directory_bytes = sum(file_size for _, file_size, _ in entries)
+            # trim to 90% so that eviction does not run again on the next write
+            for _, file_size, file_path in entries:
+                if self._directory_bytes <= self.directory_size * 0.9:
+                    break
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+                self._directory_bytes -= file_size
@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from werkzeug.security import generate_password_hash, check_password_hash
+from .concurrency import cooperative, thread_pool
+
+
+class PasswordHasher(object):
+    """Hashes and checks passwords in a bounded pool of worker processes.
+
+    PASSWORD_HASH_METHOD is a full werkzeug method such as
+    pbkdf2:sha256:150000, so the cost is part of every stored hash and older
+    hashes can be recognised and upgraded on the next successful login.
+    Request threads only wait on the pool, at most PASSWORD_HASH_WORKERS
+    hashes run at once in each uwsgi process and a login burst queues instead
+    of starving every worker; 0 hashes in the calling thread. Under gevent the pool holds real
+    threads instead, pbkdf2 releases the GIL and the hub keeps serving.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:150000'
+        self.workers = 0
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+
+    def hash(self, password, method=None):
+        return self._run(generate_password_hash, password, method or self.method)
+
+    def verify(self, hashed_password, password):
+        if not hashed_password:
+            return False
+        return self._run(check_password_hash, hashed_password, password)
+
+    def needs_rehash(self, hashed_password):
+        return hashed_password.split('$', 1)[0] != self.method
+
+    def _run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        return self._pool().submit(function, *args).result()
+
+    def _pool(self):
+        # a pool inherited through fork belongs to the parent, every worker process starts its own
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = thread_pool(self.workers) if cooperative() else ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.session import make_transient_to_detached
+
+# never kept in memory, a cached user loads them from the database when a password is checked
+CREDENTIALS = frozenset(('hashed_password', 'salt'))
+
+
+class IdentityCache(object):
+    """LRU cache of the users resolved by the Flask-Login user loader.
+
+    Entries hold plain column values of the user and its role together with
+    the permissions bitmask. A hit is merged back into the request session
+    without touching the database. Entries expire after IDENTITY_CACHE_TTL
+    seconds, which also bounds staleness across worker processes. The
+    password hash and salt are left out, check_password on a cached user
+    loads them with a query of its own.
+    """
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config['IDENTITY_CACHE_TTL']
+        self.size = app.config['IDENTITY_CACHE_SIZE']
+        self.clear()
+
+    def load(self, user_id):
+        from . import db
+        from .models import User, Role
+
+        entry = self._get(user_id)
+        if entry is None:
+            user = User.query.options(joinedload(User.role)).get(user_id)
+            if user is not None:
+                user.can(0)
+                self._set(user_id, {'user': _columns(user), 'role': _columns(user.role) if user.role else None,
+                                    'permissions': user._permissions})
+            return user
+
+        role = _detached(Role, entry['role']) if entry['role'] is not None else None
+        user = db.session.merge(_detached(User, entry['user'], role=role), load=False)
+        user._permissions = entry['permissions']
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] < monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def _set(self, user_id, value):
+        with self._lock:
+            self._entries[user_id] = (value, monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+def _columns(instance):
+    return {attribute.key: getattr(instance, attribute.key) for attribute in instance.__mapper__.column_attrs
+            if attribute.key not in CREDENTIALS}
+
+
+def _detached(model, columns, **relations):
+    # build the instance without running the model constructor, then mark it as loaded, the columns left out expired
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in dict(columns, **relations).items():
+        setattr(instance, key, value)
+    make_transient_to_detached(instance)
+    return instance
@@ -0,0 +1,23 @@
+from importlib import import_module
+
+
+class LazyExtension(object):
+    """Stands in for an extension whose module is only imported on first use.
+
+    CLI commands never touch the web-only extensions, so they do not pay for
+    importing Flask-SocketIO, Flask-WTF or Flask-Moment.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        self._path = path
+        self._args = args
+        self._kwargs = kwargs
+        self._extension = None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._extension is None:
+            module, _, attribute = self._path.rpartition('.')
+            self._extension = getattr(import_module(module), attribute)(*self._args, **self._kwargs)
+        return getattr(self._extension, name)
@@ -1,7 +1,10 @@
 from . import main
 from .forms import ContactForm
 from ..utils import send_contact_mail
-from flask import redirect, url_for, flash, render_template
+from flask import redirect, url_for, flash, render_template, jsonify
+from flask_login import login_required
+from .. import fragments
+from ..decorators import admin_required
 
 
 @main.route('/contact', methods=['GET', 'POST'])
@@ -18,3 +21,10 @@ def contact():
 @main.route('/')
 def index():
     return render_template('main/index-page.html')
+
+
+@main.route('/cache/stats')
+@login_required
+@admin_required
+def cache_stats():
+    return jsonify(fragments=fragments.stats())
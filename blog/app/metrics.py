@@ -0,0 +1,276 @@
+import json
+import os
+import random
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+from time import perf_counter, monotonic
+from uuid import uuid4
+from flask import g, request, current_app, has_request_context, before_render_template, template_rendered, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def merge(self, counts, total):
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.sum += total
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield '%s_bucket{%s,le="%s"} %d' % (name, labels, bound, cumulative)
+        yield '%s_sum{%s} %r' % (name, labels, self.sum)
+        yield '%s_count{%s} %d' % (name, labels, cumulative)
+
+
+class Sample(object):
+    __slots__ = ('started', 'timed', 'queries', 'query_time', 'statements', 'template_time', 'template_depth', 'template_started')
+
+    def __init__(self, timed=True):
+        self.started = perf_counter()
+        self.timed = timed
+        self.queries = 0
+        self.query_time = self.template_time = 0.0
+        self.statements = []
+        self.template_depth = 0
+
+
+class Metrics(object):
+    """Per-endpoint request metrics in the Prometheus text format.
+
+    Every request records its latency, response size and the number of its
+    SQL queries, so the counters are exact. Only METRICS_SAMPLE_RATE of the
+    requests also time their statements and the rendering of templates, the
+    costly part, and those sums cover the sampled requests alone. A sampled
+    request slower than METRICS_SLOW_REQUEST_TIME is logged with its slowest
+    statements.
+
+    The uwsgi workers share one socket and a scrape reaches any of them. With
+    METRICS_DIR set, every process writes its figures to a file of its own
+    there, at most every METRICS_WRITE_INTERVAL seconds and on each scrape,
+    and /metrics adds up the files. Those of exited workers are kept so that
+    the counters never go backwards, wsgi.py empties the directory when the
+    master starts. Without it /metrics only shows the process that answers.
+    """
+
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self.directory = None
+        self._file = None
+        self._written_at = 0
+        self.reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sample_rate = app.config['METRICS_SAMPLE_RATE']
+        self.slow_request_time = app.config['METRICS_SLOW_REQUEST_TIME']
+        self.slow_statements = app.config['METRICS_SLOW_STATEMENTS']
+        self.directory = app.config['METRICS_DIR']
+        self.write_interval = app.config['METRICS_WRITE_INTERVAL']
+        self.reset()
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self._expose)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        if not event.contains(Engine, 'before_cursor_execute', _query_started):
+            event.listen(Engine, 'before_cursor_execute', _query_started)
+            event.listen(Engine, 'after_cursor_execute', _query_finished)
+            event.listen(Engine, 'handle_error', _query_failed)
+
+    def clear_directory(self):
+        if self.directory and os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.json'):
+                    os.remove(entry.path)
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+            self.queries = defaultdict(int)
+            self.query_time = defaultdict(float)
+            self.template_time = defaultdict(float)
+
+    def _start(self):
+        g._metrics = Sample(bool(self.sample_rate) and (self.sample_rate >= 1 or random.random() < self.sample_rate))
+
+    def _finish(self, response):
+        sample = g.pop('_metrics', None)
+        if sample is None:
+            return response
+
+        elapsed = perf_counter() - sample.started
+        endpoint = request.endpoint or 'unknown'
+        size = response.calculate_content_length()
+        with self._lock:
+            self.latency[endpoint].observe(elapsed)
+            if size is not None:
+                self.size[endpoint].observe(size)
+            self.queries[endpoint] += sample.queries
+            if sample.timed:
+                self.query_time[endpoint] += sample.query_time
+                self.template_time[endpoint] += sample.template_time
+        if self.directory and monotonic() - self._written_at >= self.write_interval:
+            self._write()
+
+        if sample.timed and elapsed >= self.slow_request_time:
+            statements = sorted(sample.statements, key=lambda statement: statement[0], reverse=True)[:self.slow_statements]
+            current_app.logger.warning('Slow request: %s %s took %.3fs, %d queries in %.3fs, templates %.3fs%s' % (
+                request.method, request.full_path, elapsed, sample.queries, sample.query_time, sample.template_time,
+                ''.join('\n  %.3fs %s' % statement for statement in statements)))
+        return response
+
+    def _template_started(self, sender, template, context, **extra):
+        sample = g.get('_metrics') if has_request_context() else None
+        if sample is not None and sample.timed:
+            # fragments render templates from within templates, only time the outermost one
+            if sample.template_depth == 0:
+                sample.template_started = perf_counter()
+            sample.template_depth += 1
+
+    def _template_finished(self, sender, template, context, **extra):
+        sample = g.get('_metrics') if has_request_context() else None
+        if sample is not None and sample.timed and sample.template_depth:
+            sample.template_depth -= 1
+            if sample.template_depth == 0:
+                sample.template_time += perf_counter() - sample.template_started
+
+    def snapshot(self):
+        from . import fragments, concurrency
+
+        with self._lock:
+            figures = {
+                'latency': {endpoint: [histogram.counts, histogram.sum] for endpoint, histogram in self.latency.items()},
+                'size': {endpoint: [histogram.counts, histogram.sum] for endpoint, histogram in self.size.items()},
+                'queries': dict(self.queries),
+                'query_time': dict(self.query_time),
+                'template_time': dict(self.template_time),
+            }
+        figures['fragments'] = fragments.stats()
+        figures['blocked'] = {'count': concurrency.blocked, 'seconds': concurrency.blocked_time}
+        return figures
+
+    def _write(self):
+        # a forked worker, or one respawned under a reused pid, must not overwrite another's file
+        if self._file is None or not self._file.startswith('%d-' % os.getpid()):
+            self._file = '%d-%s.json' % (os.getpid(), uuid4().hex[:8])
+        self._written_at = monotonic()
+        path = os.path.join(self.directory, self._file)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + '.tmp', 'w') as stream:
+                json.dump(self.snapshot(), stream)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            current_app.logger.warning('Could not write the metrics to %s: %s' % (path, e))
+
+    def _snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self._write()
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    with open(entry.path) as stream:
+                        snapshots.append(json.load(stream))
+                except (OSError, ValueError):
+                    continue
+        return snapshots
+
+    def _expose(self):
+        latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        totals = {'queries': defaultdict(int), 'query_time': defaultdict(float), 'template_time': defaultdict(float)}
+        stats, blocked = defaultdict(int), defaultdict(float)
+        for snapshot in self._snapshots():
+            for histograms, name in ((latency, 'latency'), (size, 'size')):
+                for endpoint, (counts, total) in snapshot[name].items():
+                    histograms[endpoint].merge(counts, total)
+            for name, values in totals.items():
+                for endpoint, value in snapshot[name].items():
+                    values[endpoint] += value
+            for name, value in snapshot['fragments'].items():
+                stats[name] += value
+            for name, value in snapshot['blocked'].items():
+                blocked[name] += value
+
+        lines = []
+        _family(lines, 'blog_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+        for endpoint, histogram in sorted(latency.items()):
+            lines.extend(histogram.lines('blog_request_duration_seconds', _label(endpoint)))
+        _family(lines, 'blog_response_size_bytes', 'histogram', 'Response size by endpoint.')
+        for endpoint, histogram in sorted(size.items()):
+            lines.extend(histogram.lines('blog_response_size_bytes', _label(endpoint)))
+        for name, kind, description, values in (
+                ('blog_db_queries_total', 'counter', 'SQL statements executed by endpoint.', totals['queries']),
+                ('blog_db_query_seconds_total', 'counter', 'Time spent in SQL statements by endpoint, '
+                 'in the METRICS_SAMPLE_RATE sampled requests only.', totals['query_time']),
+                ('blog_template_render_seconds_total', 'counter', 'Time spent rendering templates by endpoint, '
+                 'in the METRICS_SAMPLE_RATE sampled requests only.', totals['template_time'])):
+            _family(lines, name, kind, description)
+            lines.extend('%s{%s} %r' % (name, _label(endpoint), value) for endpoint, value in sorted(values.items()))
+
+        _family(lines, 'blog_fragment_cache_lookups_total', 'counter', 'Fragment cache lookups by result.')
+        for result in ('hits', 'shared_hits', 'misses'):
+            lines.append('blog_fragment_cache_lookups_total{result="%s"} %d' % (result, stats[result]))
+        _family(lines, 'blog_fragment_cache_entries', 'gauge', 'Fragments held in memory.')
+        lines.append('blog_fragment_cache_entries %d' % stats['size'])
+        _family(lines, 'blog_event_loop_blocked_total', 'counter', 'Calls that held the gevent hub longer than GEVENT_MAX_BLOCKING_TIME.')
+        lines.append('blog_event_loop_blocked_total %d' % blocked['count'])
+        _family(lines, 'blog_event_loop_blocked_seconds_total', 'counter', 'Time the gevent hub was held by those calls.')
+        lines.append('blog_event_loop_blocked_seconds_total %r' % blocked['seconds'])
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    sample = g.get('_metrics') if has_request_context() else None
+    if sample is not None and sample.timed:
+        conn.info.setdefault('_metrics_started', []).append(perf_counter())
+
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    started = conn.info.get('_metrics_started')
+    elapsed = perf_counter() - started.pop() if started else None
+    sample = g.get('_metrics')
+    if sample is not None:
+        sample.queries += 1
+        if elapsed is not None:
+            sample.query_time += elapsed
+            sample.statements.append((elapsed, statement))
+
+
+def _query_failed(context):
+    # a statement that raises never reaches after_cursor_execute, one that fails to compile never started
+    if context.connection is not None and context.execution_context is not None:
+        started = context.connection.info.get('_metrics_started')
+        if started:
+            started.pop()
+
+
+def _family(lines, name, kind, description):
+    lines.append('# HELP %s %s' % (name, description))
+    lines.append('# TYPE %s %s' % (name, kind))
+
+
+def _label(endpoint):
+    return 'endpoint="%s"' % endpoint.replace('\\', '\\\\').replace('"', '\\"')
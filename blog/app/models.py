@@ -1,68 +1,168 @@
-from werkzeug.security import generate_password_hash, check_password_hash
-from itsdangerous import TimedJSONWebSignatureSerializer as Serializer, BadData
 from flask_login import UserMixin, AnonymousUserMixin
-from flask import current_app
-from . import db, login_manager
-from datetime import datetime, timedelta
+from flask_mail import Message as MailMessage
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import joinedload
+from . import db, login_manager, presence, identity, passwords, tokens
+from datetime import datetime
 from hashlib import md5
 
 
+class CounterMixin(object):
+    @classmethod
+    def increment(cls, identifier, **counters):
+        values = {getattr(cls, name): getattr(cls, name) + delta for name, delta in counters.items()}
+        db.session.query(cls).filter(cls.id == identifier).update(values, synchronize_session=False)
+
+
 class RoomUserAssociation(db.Model):
     __tablename__ = 'rooms_users'
+    __table_args__ = (db.Index('ix_rooms_users_room_id_user_id', 'room_id', 'user_id'),)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('rooms.id'), primary_key=True)
     user = db.relationship("User", cascade="all")
     room = db.relationship("Room", cascade="all")
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class Room(db.Model):
     __tablename__ = 'rooms'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     room_users = db.relationship('RoomUserAssociation', cascade="all")
 
     def is_author(self, user):
         return self.author_id == user.id
 
-    def online_users(self):
-        return [room_user for room_user in self.room_users if room_user.user.is_online()]
 
-    def offline_users(self):
-        return [room_user for room_user in self.room_users if not room_user.user.is_online()]
+class Message(db.Model):
+    __tablename__ = 'messages'
+    __table_args__ = (db.Index('ix_messages_room_id_id', 'room_id', 'id'),)
+    id = db.Column(db.Integer(), primary_key=True)
+    room_id = db.Column(db.Integer(), db.ForeignKey('rooms.id'), nullable=False)
+    author_id = db.Column(db.Integer(), db.ForeignKey('users.id'))
+    body = db.Column(db.Text())
+    timestamp = db.Column(db.DateTime(), default=datetime.utcnow)
+    author = db.relationship('User')
+
+    @staticmethod
+    def history(room_id):
+        return Message.query.filter_by(room_id=room_id).options(joinedload(Message.author).load_only('id', 'username', 'first_name', 'last_name'))
+
+    def to_json(self):
+        return {'id': self.id, 'username': self.author.username, 'user_full_name': self.author.full_name(), 'message': self.body,
+                'timestamp': self.timestamp.isoformat() + 'Z'}
 
 
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (db.Index('ix_comments_post_id_disabled_timestamp', 'post_id', 'disabled', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.String)
     disabled = db.Column(db.Boolean, default=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     author_id = db.Column(db.Integer(), db.ForeignKey('users.id'))
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id'))
 
+    @staticmethod
+    def feed(post, viewer):
+        query = Comment.query.filter_by(post_id=post.id). \
+            options(joinedload(Comment.author).load_only('id', 'username', 'email', 'first_name', 'last_name', 'last_seen', 'version'))
+        if not viewer.can(Permission.ADMIN) and not viewer.can(Permission.MODERATE):
+            query = query.filter_by(disabled=False)
+        return query
+
 
 class Follow(db.Model):
     __tablename__ = 'follows'
-    timestamp = db.Column(db.DateTime(), index=True, default=datetime.utcnow())
+    __table_args__ = (db.Index('ix_follows_follower_id_timestamp', 'follower_id', 'timestamp'),
+                      db.Index('ix_follows_followed_id_timestamp', 'followed_id', 'timestamp'))
+    timestamp = db.Column(db.DateTime(), index=True, default=datetime.utcnow)
     follower_id = db.Column(db.Integer(), db.ForeignKey('users.id'), primary_key=True)
     followed_id = db.Column(db.Integer(), db.ForeignKey('users.id'), primary_key=True)
 
 
-class Post(db.Model):
+class Post(CounterMixin, db.Model):
     __tablename__ = 'posts'
+    __table_args__ = (db.Index('ix_posts_author_id_timestamp_id', 'author_id', 'timestamp', 'id'),)
     id = db.Column(db.Integer(), primary_key=True)
     image_filename = db.Column(db.String(200), default=None)
     title = db.Column(db.String)
     body = db.Column(db.Text())
-    timestamp = db.Column(db.DateTime(), index=True, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime(), index=True, default=datetime.utcnow)
     author_id = db.Column(db.Integer(), db.ForeignKey('users.id'))
+    comments_count = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer(), nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime(), default=datetime.utcnow, onupdate=datetime.utcnow)
     comments = db.relationship('Comment', backref='post', lazy='dynamic')
 
     def is_author(self, author):
-        return self.author == author
+        return author.is_authenticated and self.author_id == author.id
+
+    @staticmethod
+    def listing():
+        return Post.query.options(joinedload(Post.author).load_only('id', 'username', 'first_name', 'last_name', 'version'))
+
+
+class ContentVersion(db.Model):
+    """A version and modification time per listing, bumped by every write that changes it.
+
+    The validators of the cached pages read one row instead of aggregating
+    the tables the listing is built from, and deletions move it as well.
+    """
+    __tablename__ = 'content_versions'
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer(), nullable=False, default=1)
+    updated_at = db.Column(db.DateTime(), nullable=False, default=datetime.utcnow)
+
+    @staticmethod
+    def current(name):
+        return tuple(db.session.query(ContentVersion.updated_at, ContentVersion.version).filter_by(name=name).first() or (None, 0))
+
+    @staticmethod
+    def bump(connection, name):
+        table = ContentVersion.__table__
+        now = datetime.utcnow()
+        if not connection.execute(table.update().where(table.c.name == name).values(version=table.c.version + 1, updated_at=now)).rowcount:
+            connection.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+
+class TimelineEntry(db.Model):
+    __tablename__ = 'timeline_entries'
+    __table_args__ = (db.Index('ix_timeline_entries_user_id_timestamp_post_id', 'user_id', 'timestamp', 'post_id'),)
+    user_id = db.Column(db.Integer(), db.ForeignKey('users.id'), primary_key=True)
+    post_id = db.Column(db.Integer(), db.ForeignKey('posts.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime())
+    post = db.relationship('Post')
+
+
+class UsedToken(db.Model):
+    __tablename__ = 'used_tokens'
+    jti = db.Column(db.String(32), primary_key=True)
+    expires_at = db.Column(db.DateTime(), index=True)
+
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'outbox_messages'
+    __table_args__ = (db.Index('ix_outbox_messages_status_next_attempt_at', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer(), primary_key=True)
+    sender = db.Column(db.String(254))
+    recipients = db.Column(db.Text())
+    subject = db.Column(db.String(255))
+    body = db.Column(db.Text())
+    html = db.Column(db.Text())
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    attempts = db.Column(db.Integer(), nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(), default=datetime.utcnow)
+    claim = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime())
+    last_error = db.Column(db.Text())
+    timestamp = db.Column(db.DateTime(), default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime())
+
+    def to_message(self):
+        return MailMessage(subject=self.subject, sender=self.sender, recipients=self.recipients.splitlines(), body=self.body, html=self.html)
 
 
 class Role(db.Model):
@@ -101,7 +201,7 @@ class Permission:
     ADMIN = 16
 
 
-class User(UserMixin, db.Model):
+class User(CounterMixin, UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer(), primary_key=True)
     username = db.Column(db.String(64), unique=True)
@@ -114,25 +214,36 @@ class User(UserMixin, db.Model):
     about_me = db.Column(db.Text())
     address = db.Column(db.Text())
     member_since = db.Column(db.DateTime(), default=datetime.utcnow)
-    last_seen = db.Column(db.DateTime(), default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime(), index=True, default=datetime.utcnow)
     news_letter = db.Column(db.Boolean(), default=False)
     salt = db.Column(db.String(128))
     hashed_password = db.Column(db.String(128))
     confirmed = db.Column(db.Boolean(), default=False)
-    deleted_at = db.Column(db.DateTime(), nullable=True)
+    deleted_at = db.Column(db.DateTime(), nullable=True, index=True)
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
+    followers_count = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+    posts_count = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+    comments_count = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer(), nullable=False, default=1, server_default='1')
     role = db.relationship("Role")
     posts = db.relationship("Post", backref=db.backref('author'), lazy='dynamic')
     following = db.relationship("Follow", foreign_keys=[Follow.follower_id], backref=db.backref('follower', lazy='joined'), lazy='dynamic', cascade='all, delete-orphan')
     followed = db.relationship("Follow", foreign_keys=[Follow.followed_id], backref=db.backref('followed', lazy='joined'), lazy='dynamic', cascade='all, delete-orphan')
     comments = db.relationship("Comment", backref=db.backref('author'), lazy='dynamic')
     rooms = db.relationship("Room", backref=db.backref('author'), lazy='dynamic')
+    _permissions = None
 
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
         if self.role is None:
             self.role = Role.query.filter_by(default=True).first()
 
+    @classmethod
+    def increment(cls, identifier, **counters):
+        super(User, cls).increment(identifier, **counters)
+        identity.invalidate(identifier)
+
     def is_following(self, follower):
         return Follow.query.filter_by(follower_id=follower.id, followed_id=self.id).first() is not None
 
@@ -153,14 +264,13 @@ class User(UserMixin, db.Model):
 
     @password.setter
     def password(self, password):
-        self.hashed_password = generate_password_hash(password)
+        self.hashed_password = passwords.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.hashed_password, password)
+        return passwords.verify(self.hashed_password, password)
 
     def generate_token(self, expiration=3600):
-        s = Serializer(current_app.config['SECRET_KEY'], expiration)
-        return s.dumps({'confirm': self.id}).decode('utf-8')
+        return tokens.generate('confirm', self.id, expiration)
 
     def check_token(self, token):
         if User.extract_token(token) != self.id:
@@ -169,39 +279,68 @@ class User(UserMixin, db.Model):
         return True
 
     def can(self, perm):
-        return self.role is not None and self.role.has_permission(perm)
+        if self._permissions is None:
+            self._permissions = (self.role.permissions or 0) if self.role is not None else 0
+        return self._permissions & perm == perm
 
     def is_administrator(self):
         return self.can(Permission.ADMIN)
 
     def ping(self):
-        self.last_seen = datetime.utcnow()
+        presence.ping(self.id)
 
     def is_online(self):
-        return self.last_seen < datetime.utcnow() - timedelta(minutes=2)
+        return presence.is_online(self)
 
     @classmethod
     def extract_token(cls, token):
-        s = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = s.loads(token.encode('utf8'))
-        except BadData:
-            return None
-        else:
-            return data.get('confirm', None)
+        return tokens.extract('confirm', token)
+
+
+@event.listens_for(User.role, 'set')
+def _reset_permissions(target, value, old_value, initiator):
+    target._permissions = None
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_delete')
+def _post_changed(mapper, connection, target):
+    ContentVersion.bump(connection, 'posts')
+
+
+@event.listens_for(Post, 'after_update')
+def _post_edited(mapper, connection, target):
+    # a comment added through the post's relationship flushes the post without changing it
+    state = inspect(target)
+    if any(state.attrs[column.key].history.has_changes() for column in mapper.column_attrs):
+        ContentVersion.bump(connection, 'posts')
+
+
+@event.listens_for(User, 'after_update')
+def _author_changed(mapper, connection, target):
+    # the listings show author names and avatars derived from the email
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ('username', 'first_name', 'last_name', 'email')):
+        ContentVersion.bump(connection, 'posts')
 
 
 class AnonymousUser(AnonymousUserMixin):
     def can(self, perm):
         return False
 
+    def is_following(self, follower):
+        return False
+
+    def is_followed(self, followed):
+        return False
+
     def is_administrator(self):
         return False
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity.load(int(user_id))
 
 
 login_manager.anonymous_user = AnonymousUser
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+from os import getpid
+from smtplib import SMTPException, SMTPServerDisconnected
+from threading import Event, Thread
+from uuid import uuid4
+from sqlalchemy import and_, or_
+
+
+class Outbox(object):
+    """Durable queue in front of Flask-Mail.
+
+    Requests only store the rendered message. A daemon thread per process
+    claims due messages with a conditional UPDATE, sends them over one SMTP
+    connection and retries failures with exponential backoff until
+    OUTBOX_MAX_ATTEMPTS, after which they are marked dead. A message the
+    server refuses only counts against itself, losing the connection counts
+    against the rest of the batch.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._wake = Event()
+        self._worker = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.worker = app.config['OUTBOX_WORKER']
+        self.batch_size = app.config['OUTBOX_BATCH_SIZE']
+        self.max_attempts = app.config['OUTBOX_MAX_ATTEMPTS']
+        self.retry_delay = app.config['OUTBOX_RETRY_DELAY']
+        self.max_retry_delay = app.config['OUTBOX_MAX_RETRY_DELAY']
+        self.poll_interval = app.config['OUTBOX_POLL_INTERVAL']
+        self.claim_timeout = timedelta(seconds=app.config['OUTBOX_CLAIM_TIMEOUT'])
+        # pick up what a previous process left behind
+        app.before_first_request(self._start)
+
+    def enqueue(self, message):
+        from . import db
+        from .models import OutboxMessage
+
+        db.session.add(OutboxMessage(sender=message.sender, recipients='\n'.join(message.recipients), subject=message.subject,
+                                     body=message.body, html=message.html))
+        db.session.commit()
+        self._start()
+        self._wake.set()
+
+    def deliver(self):
+        from . import db, mail
+        from .models import OutboxMessage
+
+        now = datetime.utcnow()
+        due = or_(and_(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now),
+                  and_(OutboxMessage.status == 'sending', OutboxMessage.claimed_at < now - self.claim_timeout))
+        ids = [identifier for identifier, in db.session.query(OutboxMessage.id).filter(due).order_by(OutboxMessage.id).limit(self.batch_size)]
+        if not ids:
+            return 0
+
+        # the condition is evaluated again by the UPDATE, a message claimed by another worker in between is skipped
+        claim = uuid4().hex
+        OutboxMessage.query.filter(OutboxMessage.id.in_(ids), due). \
+            update({'status': 'sending', 'claim': claim, 'claimed_at': now}, synchronize_session=False)
+        db.session.commit()
+
+        pending = OutboxMessage.query.filter_by(claim=claim).order_by(OutboxMessage.id).all()
+        try:
+            with mail.connect() as connection:
+                while pending:
+                    message = pending[0]
+                    try:
+                        connection.send(message.to_message())
+                    except Exception as error:
+                        if _connection_lost(error):
+                            raise
+                        self.app.logger.warning('Could not deliver message %d: %s' % (message.id, error))
+                        self._retry(message, error, now)
+                    else:
+                        message.status, message.claim, message.sent_at = 'sent', None, datetime.utcnow()
+                    pending.pop(0)
+        except Exception as error:
+            self.app.logger.warning('Could not deliver %d messages: %s' % (len(pending), error))
+            for message in pending:
+                self._retry(message, error, now)
+        db.session.commit()
+        return len(ids)
+
+    def deliver_all(self):
+        delivered = 0
+        while True:
+            count = self.deliver()
+            if not count:
+                return delivered
+            delivered += count
+
+    def _retry(self, message, error, now):
+        message.attempts += 1
+        message.last_error = str(error)
+        message.claim = None
+        if message.attempts >= self.max_attempts:
+            message.status = 'dead'
+            self.app.logger.error('Giving up on message %d to %s after %d attempts' % (message.id, message.recipients, message.attempts))
+        else:
+            message.status = 'pending'
+            message.next_attempt_at = now + timedelta(seconds=min(self.retry_delay * 2 ** (message.attempts - 1), self.max_retry_delay))
+
+    def _start(self):
+        # threads do not survive a fork, every uwsgi worker starts its own
+        if not self.worker or (self._worker is not None and self._pid == getpid()):
+            return
+        self._pid = getpid()
+        self._worker = Thread(target=self._run, name='outbox', daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        from . import db
+
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    self.deliver_all()
+                except Exception:
+                    self.app.logger.exception('Outbox delivery failed')
+                finally:
+                    db.session.remove()
+
+
+def _connection_lost(error):
+    # SMTPException derives from OSError, a refusal of one message leaves the connection usable
+    return isinstance(error, SMTPServerDisconnected) or isinstance(error, OSError) and not isinstance(error, SMTPException)
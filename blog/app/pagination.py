@@ -0,0 +1,92 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
+from json import dumps, loads
+from time import monotonic
+from flask import current_app
+from sqlalchemy import and_, or_
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+COUNT_CACHE_SIZE = 1024
+
+_counts = {}
+
+
+def encode_cursor(values, backwards=False):
+    values = [{'dt': value.strftime(DATETIME_FORMAT)} if isinstance(value, datetime) else value for value in values]
+    payload = dumps({'b': backwards, 'k': values}, separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+        values = [datetime.strptime(value['dt'], DATETIME_FORMAT) if isinstance(value, dict) else value
+                  for value in payload['k']]
+        return bool(payload['b']), values
+    except (ValueError, TypeError, KeyError):
+        return False, None
+
+
+class KeysetPagination(object):
+    """Seek pagination over an ordered set of indexed columns.
+
+    The last column must be unique (usually the primary key) so that rows
+    sharing the leading values keep a stable order.
+    """
+
+    def __init__(self, query, columns, cursor=None, per_page=20, descending=False, key=None, count_key=None):
+        self.per_page = per_page
+        self.columns = columns
+        self.key = key or (lambda item: [getattr(item, column.key) for column in columns])
+        self.count_key = count_key
+        self._count_query = query
+
+        backwards, values = decode_cursor(cursor) if cursor else (False, None)
+        if values is not None and len(values) != len(columns):
+            backwards, values = False, None
+
+        # walking backwards is a forward walk in the opposite order, reversed afterwards
+        reverse = descending != backwards
+        if values is not None:
+            query = query.filter(_seek(columns, values, reverse))
+        query = query.order_by(*[column.desc() if reverse else column.asc() for column in columns])
+
+        items = query.limit(per_page + 1).all()
+        more = len(items) > per_page
+        items = items[:per_page]
+        if backwards:
+            items.reverse()
+            self.has_prev, self.has_next = more, True
+        else:
+            self.has_prev, self.has_next = values is not None, more
+
+        self.items = items
+        self.prev_cursor = encode_cursor(self.key(items[0]), True) if self.has_prev and items else None
+        self.next_cursor = encode_cursor(self.key(items[-1])) if self.has_next and items else None
+
+    @property
+    def total(self):
+        if self.count_key is None:
+            return None
+        return cached_count(self.count_key, self._count_query, current_app.config['FLASKY_COUNT_CACHE_TTL'])
+
+
+def cached_count(key, query, ttl):
+    now = monotonic()
+    entry = _counts.get(key)
+    if entry is not None and entry[1] > now:
+        return entry[0]
+
+    if len(_counts) >= COUNT_CACHE_SIZE:
+        _counts.clear()
+    total = query.order_by(None).count()
+    _counts[key] = (total, now + ttl)
+    return total
+
+
+def _seek(columns, values, descending):
+    clauses = []
+    for index, column in enumerate(columns):
+        bound = column < values[index] if descending else column > values[index]
+        clauses.append(and_(*[columns[i] == values[i] for i in range(index)], bound))
+    return or_(*clauses)
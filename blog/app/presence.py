@@ -0,0 +1,172 @@
+import atexit
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
+from time import monotonic
+from sqlalchemy import bindparam, case, event, func, or_
+
+RoomPresence = namedtuple('RoomPresence', 'online offline')
+
+
+class PresenceTracker(object):
+    """Keeps users' last seen times in memory and writes them behind.
+
+    Pings closer together than PRESENCE_GRANULARITY are dropped, the rest are
+    flushed to the users table with one bulk UPDATE once PRESENCE_FLUSH_SIZE
+    users are pending or PRESENCE_FLUSH_INTERVAL seconds have passed, checked
+    on every ping and at the end of every request. What is left is flushed
+    at exit, unless the users table is dropped first, which forgets it along
+    with the exit hook. Users with an open Socket.IO connection to this
+    process are always online.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = Lock()
+        self.reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from .models import User
+
+        if self.app is None:
+            atexit.register(self._flush_at_exit)
+        self.app = app
+        self.granularity = timedelta(seconds=app.config['PRESENCE_GRANULARITY'])
+        self.window = timedelta(seconds=app.config['PRESENCE_ONLINE_WINDOW'])
+        self.flush_interval = app.config['PRESENCE_FLUSH_INTERVAL']
+        self.flush_size = app.config['PRESENCE_FLUSH_SIZE']
+        self.reset()
+
+        app.teardown_request(self._flush_if_due)
+        if not event.contains(User.__table__, 'after_drop', self._dropped):
+            event.listen(User.__table__, 'after_drop', self._dropped)
+
+    def reset(self):
+        with self._lock:
+            self._seen = {}
+            self._dirty = {}
+            self._sockets = {}
+            self._connected = Counter()
+            self._flushed_at = monotonic()
+
+    def ping(self, user_id, now=None):
+        now = now or datetime.utcnow()
+        with self._lock:
+            seen = self._seen.get(user_id)
+            if seen is not None and now - seen < self.granularity:
+                return False
+
+            self._seen[user_id] = now
+            self._dirty[user_id] = now
+            due = len(self._dirty) >= self.flush_size or monotonic() - self._flushed_at >= self.flush_interval
+
+        if due:
+            self.flush()
+        return True
+
+    def close(self):
+        """Forgets the pending times and the exit hook, the app and its database are going away."""
+        atexit.unregister(self._flush_at_exit)
+        self.app = None
+        self.reset()
+
+    def connect(self, user_id, sid):
+        with self._lock:
+            self._sockets[sid] = user_id
+            self._connected[user_id] += 1
+        self.ping(user_id)
+
+    def disconnect(self, sid):
+        with self._lock:
+            user_id = self._sockets.pop(sid, None)
+            if user_id is None:
+                return
+            self._connected[user_id] -= 1
+            if not self._connected[user_id]:
+                del self._connected[user_id]
+
+    def flush(self):
+        from . import db
+        from .models import User
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._flushed_at = monotonic()
+            # forget users who went quiet, the database has their last ping by now
+            since = datetime.utcnow() - self.window
+            self._seen = {user_id: seen for user_id, seen in self._seen.items() if seen > since or user_id in dirty}
+
+        if not dirty:
+            return
+
+        table = User.__table__
+        statement = table.update().where(table.c.id == bindparam('user_id')).values(last_seen=bindparam('seen'))
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(statement, [{'user_id': user_id, 'seen': seen} for user_id, seen in dirty.items()])
+        except Exception:
+            with self._lock:
+                for user_id, seen in dirty.items():
+                    self._dirty.setdefault(user_id, seen)
+            self.app.logger.exception('Could not flush %d last seen times' % len(dirty))
+
+    def last_seen(self, user):
+        seen = self._seen.get(user.id)
+        if seen is None or user.last_seen is None:
+            return seen or user.last_seen
+        return max(seen, user.last_seen)
+
+    def is_online(self, user):
+        seen = self.last_seen(user)
+        return user.id in self._connected or seen is not None and seen > datetime.utcnow() - self.window
+
+    def online_user_ids(self, since):
+        with self._lock:
+            return list({user_id for user_id, seen in self._seen.items() if seen > since}.union(self._connected))
+
+    def room_presence(self, room_ids):
+        from . import db
+        from .models import User, RoomUserAssociation
+
+        rooms = {room_id: RoomPresence(0, 0) for room_id in room_ids}
+        if not rooms:
+            return rooms
+
+        online = case([(self._online(User), 1)], else_=0)
+        query = db.session.query(RoomUserAssociation.room_id, func.count(User.id), func.sum(online)). \
+            join(User, User.id == RoomUserAssociation.user_id). \
+            filter(RoomUserAssociation.room_id.in_(rooms)).group_by(RoomUserAssociation.room_id)
+        for room_id, members, online_members in query:
+            rooms[room_id] = RoomPresence(online_members or 0, members - (online_members or 0))
+        return rooms
+
+    def room_members(self, room_id):
+        from . import db
+        from .models import User, RoomUserAssociation
+
+        query = db.session.query(User, case([(self._online(User), True)], else_=False)). \
+            join(RoomUserAssociation, RoomUserAssociation.user_id == User.id). \
+            filter(RoomUserAssociation.room_id == room_id).order_by(User.username)
+        return [(user, bool(online)) for user, online in query]
+
+    def _online(self, model):
+        since = datetime.utcnow() - self.window
+        # pings that are not flushed yet only live in memory
+        live = self.online_user_ids(since)
+        return or_(model.last_seen > since, model.id.in_(live)) if live else model.last_seen > since
+
+    def _flush_if_due(self, exception=None):
+        with self._lock:
+            due = self._dirty and monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _dropped(self, target, connection, **kw):
+        if self.app is not None:
+            self.close()
+
+    def _flush_at_exit(self):
+        with self.app.app_context():
+            self.flush()
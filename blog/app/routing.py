@@ -0,0 +1,81 @@
+import random
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, _EngineConnector
+from sqlalchemy import orm
+from sqlalchemy.sql.selectable import Select, CompoundSelect
+
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+class RoutingSession(SignallingSession):
+    """Sends the reads of replica routed requests to one of the replicas.
+
+    Anything else goes to the primary: flushes, UPDATE and DELETE statements,
+    locking reads, and every read that follows a write in the same session so
+    that a request always sees its own changes.
+    """
+
+    def __init__(self, db, **options):
+        super(RoutingSession, self).__init__(db, **options)
+        self.db = db
+        self.use_replica = False
+        self._replica = None
+        self._written = False
+
+    def get_bind(self, mapper=None, clause=None):
+        bind = super(RoutingSession, self).get_bind(mapper, clause)
+        if bind is not self.bind:
+            return bind
+
+        if self._flushing or not _is_read(clause):
+            self._written = True
+        if not self.use_replica or self._written:
+            return bind
+
+        if self._replica is None:
+            # one replica for the whole session, so that its reads are consistent with each other
+            replicas = self.db.replicas(self.app)
+            if not replicas:
+                return bind
+            self._replica = random.choice(replicas)
+        return self._replica
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy with SQLALCHEMY_REPLICA_URIS binds and engine options per bind.
+
+    SQLALCHEMY_BIND_ENGINE_OPTIONS maps a bind key, or 'replica' for all of
+    the replicas, to options laid over SQLALCHEMY_ENGINE_OPTIONS. Queue pool
+    sizes are dropped for SQLite, which does not pool its connections.
+    """
+
+    def init_app(self, app):
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.update(('replica_%d' % index, uri) for index, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']))
+        app.config['SQLALCHEMY_BINDS'] = binds or None
+        super(RoutingSQLAlchemy, self).init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def make_connector(self, app=None, bind=None):
+        return _RoutingConnector(self, self.get_app(app), bind)
+
+    def replicas(self, app):
+        return [self.get_engine(app, 'replica_%d' % index) for index in range(len(app.config['SQLALCHEMY_REPLICA_URIS']))]
+
+
+class _RoutingConnector(_EngineConnector):
+    def get_options(self, sa_url, echo):
+        options = super(_RoutingConnector, self).get_options(sa_url, echo)
+        bind_options = self._app.config['SQLALCHEMY_BIND_ENGINE_OPTIONS']
+        if self._bind is not None and self._bind.startswith('replica_'):
+            options.update(bind_options.get('replica', {}))
+        options.update(bind_options.get(self._bind, {}))
+        if 'poolclass' in options:
+            for option in QUEUE_POOL_OPTIONS:
+                options.pop(option, None)
+        return options
+
+
+def _is_read(clause):
+    return isinstance(clause, (Select, CompoundSelect)) and clause._for_update_arg is None
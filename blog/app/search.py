@@ -0,0 +1,155 @@
+import sqlite3
+from os import getpid
+from threading import Lock
+from flask import current_app
+from markupsafe import Markup, escape
+from .pagination import encode_cursor, decode_cursor
+
+SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(title, body, post_id UNINDEXED, tokenize='porter unicode61')"
+
+SEARCH = "SELECT rowid, post_id, score, snippet FROM (" \
+         "SELECT rowid, post_id, bm25(documents, 4.0, 1.0) AS score, " \
+         "snippet(documents, -1, char(2), char(3), '...', 24) AS snippet " \
+         "FROM documents WHERE documents MATCH ?) "
+FORWARD = SEARCH + "WHERE ? IS NULL OR score > ? OR (score = ? AND rowid > ?) ORDER BY score, rowid LIMIT ?"
+BACKWARD = SEARCH + "WHERE score < ? OR (score = ? AND rowid < ?) ORDER BY score DESC, rowid DESC LIMIT ?"
+
+
+class SearchIndex(object):
+    """Full-text index of posts and comments in a local SQLite FTS5 database.
+
+    Posts are stored under rowid 2 * id and comments under 2 * id + 1, so both
+    are updated and removed by primary key. Every document carries the post
+    it links to.
+
+    The incremental updates run after the database commit, a failing one is
+    logged rather than failing the request, flask reindex catches up.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self._connection = None
+        self._pid = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config['SEARCH_INDEX_PATH']
+        self._connection = None
+
+    def index_post(self, post):
+        self._update('INSERT OR REPLACE INTO documents(rowid, title, body, post_id) VALUES (?, ?, ?, ?)',
+                    [(post.id * 2, post.title, post.body, post.id)])
+
+    def remove_post(self, post_id, comment_ids=()):
+        self._update('DELETE FROM documents WHERE rowid = ?', [(post_id * 2,)] + [(comment_id * 2 + 1,) for comment_id in comment_ids])
+
+    def index_comment(self, comment):
+        self._update('INSERT OR REPLACE INTO documents(rowid, title, body, post_id) VALUES (?, ?, ?, ?)',
+                    [(comment.id * 2 + 1, None, comment.body, comment.post_id)])
+
+    def remove_comment(self, comment_id):
+        self._update('DELETE FROM documents WHERE rowid = ?', [(comment_id * 2 + 1,)])
+
+    def search(self, text, cursor=None, per_page=10):
+        return SearchPage(self, _match_expression(text), cursor, per_page)
+
+    def reindex(self, batch_size=500):
+        from .models import Post, Comment
+
+        self._write('DELETE FROM documents', [()])
+        for batch in _batches(Post.query, Post.id, batch_size):
+            self._write('INSERT INTO documents(rowid, title, body, post_id) VALUES (?, ?, ?, ?)',
+                        [(post.id * 2, post.title, post.body, post.id) for post in batch])
+        for batch in _batches(Comment.query.filter_by(disabled=False), Comment.id, batch_size):
+            self._write('INSERT INTO documents(rowid, title, body, post_id) VALUES (?, ?, ?, ?)',
+                        [(comment.id * 2 + 1, None, comment.body, comment.post_id) for comment in batch])
+
+    def _update(self, statement, rows):
+        try:
+            self._write(statement, rows)
+        except sqlite3.Error as e:
+            current_app.logger.warning('Could not update the search index at %s: %s' % (self.path, e))
+
+    def _write(self, statement, rows):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(statement, rows)
+
+    def _read(self, statement, parameters):
+        with self._lock:
+            return self._connect().execute(statement, parameters).fetchall()
+
+    def _connect(self):
+        # connections must not survive a fork, uwsgi workers each open their own
+        if self._connection is None or self._pid != getpid():
+            self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            if self.path != ':memory:':
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(SCHEMA)
+            self._pid = getpid()
+        return self._connection
+
+
+class SearchPage(object):
+    def __init__(self, index, expression, cursor, per_page):
+        self.items = []
+        self.has_prev = self.has_next = False
+        self.prev_cursor = self.next_cursor = None
+        if expression is None:
+            return
+
+        backwards, values = decode_cursor(cursor) if cursor else (False, None)
+        if not _valid(values):
+            # a cursor this page did not produce reads as the first page, like KeysetPagination
+            backwards, values = False, None
+        if backwards and values:
+            rows = index._read(BACKWARD, (expression, values[0], values[0], values[1], per_page + 1))
+            self.has_prev, self.has_next = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+        else:
+            score, rowid = values if values else (None, None)
+            rows = index._read(FORWARD, (expression, score, score, score, rowid, per_page + 1))
+            self.has_prev, self.has_next = values is not None, len(rows) > per_page
+            rows = rows[:per_page]
+
+        self.items = [SearchHit(post_id, _highlight(snippet), rowid % 2 == 1) for rowid, post_id, score, snippet in rows]
+        if rows and self.has_prev:
+            self.prev_cursor = encode_cursor([rows[0][2], rows[0][0]], True)
+        if rows and self.has_next:
+            self.next_cursor = encode_cursor([rows[-1][2], rows[-1][0]])
+
+
+class SearchHit(object):
+    def __init__(self, post_id, snippet, is_comment):
+        self.post_id = post_id
+        self.snippet = snippet
+        self.is_comment = is_comment
+        self.post = None
+
+
+def _match_expression(text):
+    tokens = ['"%s"' % token.replace('"', '""') for token in (text or '').split()]
+    return ' '.join(tokens) or None
+
+
+def _valid(values):
+    return values is not None and len(values) == 2 and all(
+        isinstance(value, (int, float)) and not isinstance(value, bool) for value in values)
+
+
+def _highlight(snippet):
+    return escape(snippet or '').replace('\x02', Markup('<mark>')).replace('\x03', Markup('</mark>'))
+
+
+def _batches(query, column, size):
+    last_id = 0
+    while True:
+        batch = query.filter(column > last_id).order_by(column).limit(size).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+        query.session.expunge_all()
@@ -0,0 +1,142 @@
+from ipaddress import ip_address
+from multiprocessing.connection import Client, Listener
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import urlsplit
+from socketio import PubSubManager
+from config import DEFAULT_SECRET_KEY
+
+
+def message_queue_options(url, secret, allow_remote=False):
+    """Socket.IO server options for SOCKETIO_MESSAGE_QUEUE.
+
+    local://host:port is served by the broker below, anything else (redis://,
+    amqp://, zmq+tcp://...) is handed to Flask-SocketIO as is.
+    """
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(url, authkey=secret.encode('utf-8'), channel='flask-socketio',
+                                                     allow_remote=allow_remote)}
+    return {'message_queue': url}
+
+
+class LocalPubSubManager(PubSubManager):
+    """Socket.IO client manager talking to a broker over multiprocessing connections.
+
+    Meant for tests and single host deployments that have no Redis at hand.
+    """
+    name = 'local'
+
+    def __init__(self, url, authkey, channel='socketio', write_only=False, logger=None, allow_remote=False):
+        super(LocalPubSubManager, self).__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = _address(url, authkey, allow_remote)
+        self.authkey = authkey
+        self._publisher = None
+        self._lock = Lock()
+
+    def initialize(self):
+        # subscribe before the server handles its first event so that nothing is missed
+        if not self.write_only:
+            self._subscriber = self._connect('subscribe')
+        super(LocalPubSubManager, self).initialize()
+
+    def _publish(self, data):
+        with self._lock:
+            try:
+                self._publisher = self._publisher or self._connect('publish')
+                self._publisher.send((self.channel, data))
+            except (OSError, EOFError):
+                # the broker restarted, try once more on a fresh connection
+                self._publisher = self._connect('publish')
+                self._publisher.send((self.channel, data))
+
+    def _listen(self):
+        while True:
+            try:
+                channel, data = self._subscriber.recv()
+            except (OSError, EOFError):
+                self._get_logger().warning('Lost the message broker at %s:%d, reconnecting' % self.address)
+                self._subscriber = self._reconnect('subscribe')
+                continue
+            if channel == self.channel:
+                yield data
+
+    def _connect(self, role):
+        connection = Client(self.address, authkey=self.authkey)
+        connection.send(role)
+        connection.recv()
+        return connection
+
+    def _reconnect(self, role):
+        while True:
+            try:
+                return self._connect(role)
+            except (OSError, EOFError):
+                sleep(1)
+
+
+class Broker(object):
+    """Fans out every published message to every subscribed process.
+
+    Messages are pickled, whoever knows the authkey can run code in every
+    process on the queue: the broker refuses the default SECRET_KEY and, unless
+    allow_remote, any address off the loopback interface.
+    """
+
+    def __init__(self, url, authkey, allow_remote=False):
+        self.listener = Listener(_address(url, authkey, allow_remote), authkey=authkey)
+        self.subscribers = []
+        self._lock = Lock()
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    def serve_forever(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError):
+                continue
+            Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        try:
+            role = connection.recv()
+            if role == 'subscribe':
+                with self._lock:
+                    self.subscribers.append(connection)
+                connection.send('ok')
+                return
+
+            connection.send('ok')
+            while True:
+                message = connection.recv()
+                with self._lock:
+                    for subscriber in list(self.subscribers):
+                        try:
+                            subscriber.send(message)
+                        except (OSError, EOFError):
+                            self.subscribers.remove(subscriber)
+        except (OSError, EOFError):
+            connection.close()
+
+
+def _address(url, authkey, allow_remote):
+    parts = urlsplit(url)
+    host = parts.hostname or '127.0.0.1'
+    if authkey == DEFAULT_SECRET_KEY.encode('utf-8'):
+        raise ValueError('The local message queue needs a SECRET_KEY of its own, not the default one')
+    if not allow_remote and not _loopback(host):
+        raise ValueError('%s is not a loopback address, set SOCKETIO_BROKER_ALLOW_REMOTE to use it' % host)
+    return host, parts.port or 6380
+
+
+def _loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ip_address(host).is_loopback
+    except ValueError:
+        return False
@@ -1,27 +1,52 @@
-from flask_socketio import emit, join_room, leave_room, send, rooms
-from .. import socket_io
-from flask_login import current_user, login_required
+from flask import request
+from flask_socketio import emit, join_room, leave_room
+from .. import socket_io, presence, chat
+from flask_login import current_user
+from .sessions import sessions
+from .views import message_history
+
+
+@socket_io.on('connect')
+def on_connect():
+    if not current_user.is_authenticated:
+        return False
+    sessions.open(request.sid, current_user)
+    presence.connect(current_user.id, request.sid)
+
+
+@socket_io.on('disconnect')
+def on_disconnect():
+    sessions.close(request.sid)
+    presence.disconnect(request.sid)
 
 
 @socket_io.on('join')
-@login_required
 def on_join(data):
-    room = data['room']
-    join_room(room)
-    emit('status', '{} has joined the room.'.format(current_user.full_name()), room=room)
+    room_id = int(data['room'])
+    if sessions.can_enter(request.sid, room_id):
+        join_room(str(room_id))
+        emit('status', '{} has joined the room.'.format(sessions.get(request.sid).display_name), room=str(room_id))
 
 
 @socket_io.on('message')
-@login_required
 def handle_message(data):
-    message = data['message']
-    room = data['room']
-    emit('text', {'username': current_user.username, 'user_full_name': current_user.full_name(), 'message': message}, room=room)
+    room_id = int(data['room'])
+    if sessions.can_enter(request.sid, room_id):
+        session = sessions.get(request.sid)
+        chat.add(room_id, session.user_id, data['message'])
+        emit('text', {'username': session.username, 'user_full_name': session.display_name, 'message': data['message']}, room=str(room_id))
 
 
 @socket_io.on('leave')
-@login_required
 def on_leave(data):
-    room = data['room']
-    leave_room(room)
-    emit('status', '{} has left the room.'.format(current_user.full_name()), room=room)
\ No newline at end of file
+    room_id = int(data['room'])
+    if sessions.can_enter(request.sid, room_id):
+        leave_room(str(room_id))
+        emit('status', '{} has left the room.'.format(sessions.get(request.sid).display_name), room=str(room_id))
+
+
+@socket_io.on('history')
+def on_history(data):
+    room_id = int(data['room'])
+    if sessions.can_enter(request.sid, room_id):
+        emit('history', message_history(room_id, data.get('cursor')))
@@ -0,0 +1,80 @@
+from threading import Lock
+
+
+class SocketSession(object):
+    def __init__(self, user_id, username, display_name, room_ids):
+        self.user_id = user_id
+        self.username = username
+        self.display_name = display_name
+        self.room_ids = room_ids
+        self.refused = set()
+
+
+class SocketSessions(object):
+    """What every Socket.IO event needs to know about its connection.
+
+    The user, the display name and the rooms the user belongs to are resolved
+    once at connect time and kept per sid, so events are authorized in memory.
+    Room changes made by this process invalidate the room ids right away; a
+    room unknown to the cached set is looked up once more before refusing,
+    and the refusal is then kept until the next invalidate, so a client
+    repeating events for a foreign room costs no queries. A membership
+    granted by another process shows on the next invalidate or reconnect.
+    """
+
+    max_refused = 100
+
+    def __init__(self):
+        self._lock = Lock()
+        self._sessions = {}
+        self._sids = {}
+
+    def open(self, sid, user):
+        session = SocketSession(user.id, user.username, user.full_name(), _room_ids(user.id))
+        with self._lock:
+            self._sessions[sid] = session
+            self._sids.setdefault(user.id, set()).add(sid)
+        return session
+
+    def close(self, sid):
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+            if session is not None:
+                self._sids[session.user_id].discard(sid)
+                if not self._sids[session.user_id]:
+                    del self._sids[session.user_id]
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def can_enter(self, sid, room_id):
+        session = self._sessions.get(sid)
+        if session is None:
+            return False
+        if session.room_ids is not None and room_id in session.room_ids:
+            return True
+        if session.room_ids is not None and room_id in session.refused:
+            return False
+        session.room_ids = _room_ids(session.user_id)
+        if room_id in session.room_ids:
+            return True
+        if len(session.refused) >= self.max_refused:
+            session.refused.clear()
+        session.refused.add(room_id)
+        return False
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                for sid in self._sids.get(user_id, ()):
+                    self._sessions[sid].room_ids = None
+                    self._sessions[sid].refused = set()
+
+
+def _room_ids(user_id):
+    from ..models import db, RoomUserAssociation
+
+    return {room_id for room_id, in db.session.query(RoomUserAssociation.room_id).filter_by(user_id=user_id)}
+
+
+sessions = SocketSessions()
@@ -1,17 +1,22 @@
 from . import socket
-from flask import render_template, request, current_app, flash, redirect, url_for, abort
+from flask import render_template, request, current_app, flash, redirect, url_for, abort, jsonify
 from flask_login import current_user, login_required
-from ..models import db, User, Room, RoomUserAssociation
+from ..models import db, User, Room, RoomUserAssociation, Message
+from .. import presence, socket_io
+from .sessions import sessions
 from datetime import datetime, timedelta
 from .forms import RoomForm
+from ..pagination import KeysetPagination
+from ..decorators import replica
 
 
 @socket.route('/rooms')
+@replica
 @login_required
 def rooms():
-    page = request.args.get('page', type=int, default=1)
-    paginator = Room.query.paginate(page, per_page=current_app.config['FLASKY_USER_PER_PAGE'])
-    return render_template('socket/rooms-page.html', rooms=paginator.items, paginator=paginator)
+    paginator = KeysetPagination(Room.query, [Room.id], cursor=request.args.get('cursor'), per_page=current_app.config['FLASKY_USER_PER_PAGE'])
+    return render_template('socket/rooms-page.html', rooms=paginator.items, paginator=paginator,
+                           room_presence=presence.room_presence([room.id for room in paginator.items]))
 
 
 @socket.route('/new/room', methods=['GET', 'POST'])
@@ -24,6 +29,7 @@ def create_room():
         room.room_users = [RoomUserAssociation(user=user, room=room) for user in [*form.users.data, current_user]]
         db.session.add(room)
         db.session.commit()
+        sessions.invalidate([room_user.user_id for room_user in room.room_users])
         flash('Your room has been created')
     return render_template('socket/create-room-page.html', form=form)
 
@@ -32,7 +38,7 @@ def create_room():
 @login_required
 def show_room(room_id):
     room = Room.query.get_or_404(room_id) if room_id is not None else None
-    return render_template('socket/chat-page.html', current_room=room)
+    return render_template('socket/chat-page.html', current_room=room, members=presence.room_members(room.id))
 
 
 @socket.route('/delete/room/<int:room_id>', methods=['POST'])
@@ -41,8 +47,12 @@ def delete_room(room_id):
     room = Room.query.filter_by(id=room_id).first_or_404()
     if room.is_author(current_user) or current_user.is_administrator():
 
+        member_ids = [room_user.user_id for room_user in room.room_users]
+        Message.query.filter_by(room_id=room.id).delete(synchronize_session=False)
         db.session.delete(room)
         db.session.commit()
+        sessions.invalidate(member_ids)
+        socket_io.close_room(str(room_id))
 
         flash('The room has been deleted')
         return redirect(url_for('.rooms', _external=True))
@@ -53,7 +63,29 @@ def delete_room(room_id):
 @socket.route('/online/users')
 @login_required
 def online_users():
-    page = request.args.get('page', type=int, default=1)
-    paginator = User.query.filter(User.last_seen > datetime.utcnow() - timedelta(minutes=10)) \
-        .paginate(page, per_page=current_app.config['FLASKY_USER_PER_PAGE'])
+    since = datetime.utcnow() - timedelta(minutes=10)
+    # a union lets each half use its own index, an OR makes SQLite walk the whole last_seen index
+    online = db.session.query(User.id).filter(User.last_seen > since). \
+        union(db.session.query(User.id).filter(User.id.in_(presence.online_user_ids(since))))
+    query = User.query.filter(User.id.in_(online))
+    paginator = KeysetPagination(query, [User.last_seen, User.id],
+                                 cursor=request.args.get('cursor'), descending=True, per_page=current_app.config['FLASKY_USER_PER_PAGE'])
     return render_template('socket/online-users-page.html', users=paginator.items, paginator=paginator)
+
+
+@socket.route('/room/<int:room_id>/messages')
+@login_required
+def room_messages(room_id):
+    if not is_member(room_id, current_user):
+        abort(403)
+    return jsonify(message_history(room_id, request.args.get('cursor')))
+
+
+def is_member(room_id, user):
+    return RoomUserAssociation.query.filter_by(room_id=room_id, user_id=user.id).first() is not None
+
+
+def message_history(room_id, cursor):
+    paginator = KeysetPagination(Message.history(room_id), [Message.id], cursor=cursor, descending=True,
+                                 per_page=current_app.config['CHAT_HISTORY_PER_PAGE'])
+    return {'room': room_id, 'messages': [message.to_json() for message in paginator.items], 'next_cursor': paginator.next_cursor}
@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import wait
+from hashlib import sha1
+from urllib.parse import urlencode
+from flask import url_for, send_from_directory, request, redirect, abort
+from .concurrency import thread_pool, native_lock
+
+
+class Thumbnailer(object):
+    """Renders the known sizes of uploaded images off the request path.
+
+    Renditions are written to THUMBNAIL_CACHE_DIR under a name derived from
+    the upload name, its size and modification time, and the rendition size.
+    A later upload that reuses the name of a deleted one gets new names, so a
+    name always maps to the same content and the files can be served by
+    nginx with far-future expiry. Least recently read files are evicted once
+    the directory grows over THUMBNAIL_CACHE_SIZE bytes; their URLs carry
+    the upload and size, so a request for an evicted one renders it again.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._pending = {}
+        self._cache_bytes = None
+        self._lock = native_lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.cache_dir = app.config['THUMBNAIL_CACHE_DIR']
+        self.cache_url = app.config['THUMBNAIL_CACHE_URL']
+        self.cache_size = app.config['THUMBNAIL_CACHE_SIZE']
+        self.renditions = app.config['THUMBNAIL_RENDITIONS']
+        self.workers = app.config['THUMBNAIL_WORKERS']
+        self._cache_bytes = None
+        app.add_url_rule(self.cache_url + '/<path:filename>', 'thumbnail', self._send)
+        app.add_template_global(self.url, 'render_uploaded_file_url')
+
+    def url(self, filename=None, **size):
+        from . import uploads
+
+        if not filename:
+            return url_for('static', filename='img/no-image-icon.png')
+
+        name = self._name(filename, size)
+        if name is None:
+            return url_for('static', filename='img/no-image-icon.png')
+        if os.path.exists(os.path.join(self.cache_dir, name)):
+            return '%s/%s?%s' % (self.cache_url, name, urlencode(sorted(dict(size, src=filename).items())))
+
+        # serve the original until the worker catches up rather than resizing in the request
+        self.submit(filename, [size])
+        return uploads.url(filename)
+
+    def submit(self, filename, renditions=None):
+        futures = []
+        for size in renditions or self.renditions:
+            name = self._name(filename, size)
+            if name is None:
+                continue
+            with self._lock:
+                if name not in self._pending:
+                    if self._executor is None:
+                        self._executor = thread_pool(self.workers)
+                    self._pending[name] = self._executor.submit(self._render, filename, size, name)
+                futures.append(self._pending[name])
+        return futures
+
+    def warm(self, filenames):
+        wait([future for filename in filenames for future in self.submit(filename)])
+
+    def _render(self, filename, size, name):
+        from PIL import Image
+        from . import uploads
+
+        target = os.path.join(self.cache_dir, name)
+        temporary = '%s.%d.tmp' % (target, os.getpid())
+        try:
+            if os.path.exists(target):
+                return
+            with self.app.app_context():
+                source = uploads.path(filename)
+
+            with Image.open(source) as image:
+                image_format = image.format
+                image.thumbnail((size.get('width', image.width), size.get('height', image.height)), Image.LANCZOS)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                image.save(temporary, format=image_format, optimize=True, quality=85)
+            os.replace(temporary, target)
+            self._evict(os.path.getsize(target))
+        except Exception:
+            self.app.logger.exception('Could not render %s of %s' % (size, filename))
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+
+    def _evict(self, added):
+        with self._lock:
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
+            else:
+                self._cache_bytes += added
+            if self._cache_bytes <= self.cache_size:
+                return
+
+            entries = sorted((stat.st_atime, stat.st_size, entry.path)
+                             for entry, stat in ((entry, entry.stat()) for entry in os.scandir(self.cache_dir) if entry.is_file()))
+            self._cache_bytes = sum(file_size for _, file_size, _ in entries)
+            # trim to 90% so that eviction does not run again on the next write
+            for _, file_size, file_path in entries:
+                if self._cache_bytes <= self.cache_size * 0.9:
+                    break
+                os.remove(file_path)
+                self._cache_bytes -= file_size
+
+    def _send(self, filename):
+        from . import uploads
+
+        if not os.path.exists(os.path.join(self.cache_dir, filename)):
+            source = request.args.get('src')
+            size = {key: int(request.args[key]) for key in ('width', 'height') if request.args.get(key, '').isdigit()}
+            if not source or self._name(source, size) != filename:
+                abort(404)
+            # evicted, serve the original until it is rendered again
+            self.submit(source, [size])
+            return redirect(uploads.url(source))
+        return send_from_directory(self.cache_dir, filename, cache_timeout=365 * 24 * 3600)
+
+    def _name(self, filename, size):
+        from . import uploads
+
+        try:
+            stat = os.stat(uploads.path(filename))
+        except OSError:
+            return None
+        digest = sha1('{0}:{1}:{2}:{3}'.format(filename, stat.st_size, stat.st_mtime_ns, sorted(size.items())).encode('utf-8')).hexdigest()
+        return digest + os.path.splitext(filename)[1].lower()
@@ -0,0 +1,77 @@
+from flask import current_app
+from sqlalchemy import select, literal, or_
+from sqlalchemy.orm import joinedload
+from . import db
+from .models import TimelineEntry, Post, Follow, User
+from .pagination import KeysetPagination
+
+# A Follow row stores the followed author in follower_id and the reader in followed_id.
+
+
+def fan_out(post):
+    if _pulled(post.author):
+        return
+
+    entries, follows = TimelineEntry.__table__, Follow.__table__
+    readers = select([follows.c.followed_id, literal(post.id), literal(post.timestamp)]).where(follows.c.follower_id == post.author_id)
+    db.session.execute(entries.insert().from_select(['user_id', 'post_id', 'timestamp'], readers))
+
+
+def follow(reader_id, author):
+    if _pulled(author):
+        return
+
+    entries, posts = TimelineEntry.__table__, Post.__table__
+    latest = select([literal(reader_id), posts.c.id, posts.c.timestamp]).where(posts.c.author_id == author.id). \
+        order_by(posts.c.timestamp.desc()).limit(current_app.config['FLASKY_TIMELINE_BACKFILL'])
+    db.session.execute(entries.insert().from_select(['user_id', 'post_id', 'timestamp'], latest))
+
+
+def unfollow(reader_id, author_id):
+    posts = db.session.query(Post.id).filter(Post.author_id == author_id).subquery()
+    TimelineEntry.query.filter(TimelineEntry.user_id == reader_id, TimelineEntry.post_id.in_(posts)).delete(synchronize_session=False)
+
+
+def remove_post(post_id):
+    TimelineEntry.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+
+
+def paginate(user, cursor, per_page):
+    pulled = [author_id for author_id, in db.session.query(Follow.follower_id).join(User, User.id == Follow.follower_id).
+              filter(Follow.followed_id == user.id, User.followers_count > current_app.config['FLASKY_TIMELINE_FANOUT_LIMIT'])]
+
+    if not pulled:
+        query = TimelineEntry.query.filter_by(user_id=user.id). \
+            options(joinedload(TimelineEntry.post).joinedload(Post.author).load_only('id', 'username', 'first_name', 'last_name', 'version'))
+        paginator = KeysetPagination(query, [TimelineEntry.timestamp, TimelineEntry.post_id], cursor=cursor, descending=True, per_page=per_page)
+        paginator.items = [entry.post for entry in paginator.items]
+        return paginator
+
+    # authors with too many followers are not fanned out, their posts are merged in at read time
+    materialized = db.session.query(TimelineEntry.post_id).filter(TimelineEntry.user_id == user.id).subquery()
+    query = Post.listing().filter(or_(Post.id.in_(materialized), Post.author_id.in_(pulled)))
+    return KeysetPagination(query, [Post.timestamp, Post.id], cursor=cursor, descending=True, per_page=per_page)
+
+
+def backfill(batch_size=1000):
+    entries, follows, posts, users = TimelineEntry.__table__, Follow.__table__, Post.__table__, User.__table__
+    TimelineEntry.query.delete(synchronize_session=False)
+    db.session.commit()
+
+    last_id = 0
+    while True:
+        ids = [user_id for user_id, in db.session.query(User.id).filter(User.id > last_id).order_by(User.id).limit(batch_size)]
+        if not ids:
+            break
+
+        rows = select([follows.c.followed_id, posts.c.id, posts.c.timestamp]). \
+            select_from(follows.join(posts, posts.c.author_id == follows.c.follower_id).join(users, users.c.id == follows.c.follower_id)). \
+            where(follows.c.followed_id.between(ids[0], ids[-1])). \
+            where(users.c.followers_count <= current_app.config['FLASKY_TIMELINE_FANOUT_LIMIT'])
+        db.session.execute(entries.insert().from_select(['user_id', 'post_id', 'timestamp'], rows))
+        db.session.commit()
+        last_id = ids[-1]
+
+
+def _pulled(author):
+    return author.followers_count > current_app.config['FLASKY_TIMELINE_FANOUT_LIMIT']
@@ -0,0 +1,80 @@
+from datetime import datetime
+from uuid import uuid4
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer, BadData, SignatureExpired
+from sqlalchemy.exc import IntegrityError
+
+
+class TokenService(object):
+    """Signs and checks the confirmation and password reset tokens.
+
+    Serializers are built once per key and expiration instead of on every
+    call. Tokens are signed with SECRET_KEY and still accepted when signed
+    with one of SECRET_KEY_FALLBACKS, so the key can be rotated without
+    breaking the links already sent. A payload maps the purpose to the user
+    id; single use tokens also carry an id that is recorded in used_tokens
+    when they are consumed.
+    """
+
+    def __init__(self, app=None):
+        self._signers = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.secret_key = app.config['SECRET_KEY']
+        self._signers = {}
+        self._verifiers = [Serializer(key) for key in [self.secret_key] + list(app.config['SECRET_KEY_FALLBACKS'])]
+
+    def generate(self, purpose, identifier, expiration=3600, single_use=False):
+        signer = self._signers.get(expiration)
+        if signer is None:
+            signer = self._signers[expiration] = Serializer(self.secret_key, expiration)
+        payload = {purpose: identifier}
+        if single_use:
+            payload['jti'] = uuid4().hex
+        return signer.dumps(payload).decode('utf-8')
+
+    def load(self, purpose, token):
+        """Returns the payload of a valid, unused token for purpose, or None."""
+        from .models import UsedToken
+
+        payload = self._verify(token)
+        if not isinstance(payload, dict) or purpose not in payload:
+            return None
+        if 'jti' in payload and UsedToken.query.get(payload['jti']) is not None:
+            return None
+        return payload
+
+    def extract(self, purpose, token):
+        payload = self.load(purpose, token)
+        return payload[purpose] if payload is not None else None
+
+    def consume(self, payload):
+        """Records a single use token in the current transaction, False if it was used already."""
+        from . import db
+        from .models import UsedToken
+
+        now = datetime.utcnow()
+        UsedToken.query.filter(UsedToken.expires_at < now).delete(synchronize_session=False)
+        db.session.add(UsedToken(jti=payload['jti'], expires_at=datetime.utcfromtimestamp(payload['exp'])))
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        return True
+
+    def _verify(self, token):
+        data = token.encode('utf-8')
+        for verifier in self._verifiers:
+            try:
+                payload, header = verifier.loads(data, return_header=True)
+            except SignatureExpired:
+                # the signature was checked before the expiry, no other key can do better
+                return None
+            except BadData:
+                continue
+            if isinstance(payload, dict) and 'jti' in payload:
+                payload['exp'] = header['exp']
+            return payload
+        return None
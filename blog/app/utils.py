@@ -1,7 +1,6 @@
-from flask_mail import Message, Mail
+from flask_mail import Message
 from flask import render_template, current_app
-
-mail = Mail()
+from . import outbox
 
 
 def send_mail(recipients, subject, template, **kwargs):
@@ -11,9 +10,9 @@ def send_mail(recipients, subject, template, **kwargs):
     else:
         message.html = render_template(template, **kwargs)
 
-    mail.send(message=message)
+    outbox.enqueue(message)
 
 
 def send_contact_mail(sender, subject, message):
     message = Message(subject=subject, body=message, sender=sender, recipients=[current_app.config['FLASK_MAIL_SENDER']])
-    mail.send(message=message)
+    outbox.enqueue(message)
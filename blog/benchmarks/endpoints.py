@@ -0,0 +1,221 @@
+"""Drive every blueprint over a seeded data set and compare with a baseline.
+
+    python -m benchmarks.endpoints [--users 200] [--posts 2000] [--repeat 20]
+                                   [--baseline benchmarks/baseline.json] [--save]
+                                   [--latency-threshold 1.0] [--memory-threshold 0.25]
+
+Each scenario is a request through the Flask test client or an event through
+the Socket.IO test client. It reports p50 and p95 latency, the SQL statements
+issued and the peak memory allocated while it runs. With --save the results
+become the new baseline. Otherwise the run is compared with the baseline and
+exits with status 1 when a scenario issues more statements. Statement counts
+are exact on any machine, latencies and memory only compare between runs on
+the same otherwise idle one: p95 and peak memory are gated only when
+--latency-threshold or --memory-threshold give the growth they may have.
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from os import path
+from time import perf_counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import create_app, db, socket_io, fixtures, counters, timeline, search, tokens
+from app.models import User, Post, Follow, Room, RoomUserAssociation, Message
+
+BASELINE = path.join(path.dirname(__file__), 'baseline.json')
+
+statements = 0
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+def seed(arguments):
+    fixtures.exec_fixtures(users=arguments.users, posts=arguments.posts, comments=arguments.comments,
+                           seed=arguments.seed, password='password', batch_size=5000)
+    rng = random.Random(arguments.seed)
+    epoch = datetime(2020, 1, 1)
+    user_ids = [user_id for user_id, in db.session.query(User.id).order_by(User.id)]
+
+    db.session.execute(Follow.__table__.insert(), [
+        {'follower_id': author_id, 'followed_id': reader_id, 'timestamp': epoch}
+        for reader_id in user_ids for author_id in rng.sample(user_ids, min(arguments.follows, len(user_ids))) if author_id != reader_id])
+    db.session.execute(Room.__table__.insert(), [
+        {'id': room_id, 'name': 'room %d' % room_id, 'author_id': user_ids[1], 'timestamp': epoch} for room_id in range(1, arguments.rooms + 1)])
+    db.session.execute(RoomUserAssociation.__table__.insert(), [
+        {'room_id': room_id, 'user_id': user_id, 'timestamp': epoch}
+        for room_id in range(1, arguments.rooms + 1) for user_id in set(rng.sample(user_ids, min(20, len(user_ids))) + [user_ids[1]])])
+    db.session.execute(Message.__table__.insert(), [
+        {'room_id': room_id, 'author_id': rng.choice(user_ids), 'body': 'message %d' % index, 'timestamp': epoch + timedelta(seconds=index)}
+        for room_id in range(1, arguments.rooms + 1) for index in range(arguments.messages)])
+    db.session.commit()
+    counters.recount()
+    timeline.backfill()
+    search.reindex()
+
+
+def scenarios(app, reader, author, post_id, term):
+    anonymous, member, admin = app.test_client(), app.test_client(), app.test_client()
+    member.post('/auth/login', data={'username': reader, 'password': 'password'})
+    admin.post('/auth/login', data={'username': 'admin', 'password': '123456'})
+    socket = socket_io.test_client(app, flask_test_client=member)
+    reset_token = tokens.generate('reset', 2, single_use=True)
+
+    def get(client, url):
+        return lambda: client.get(url)
+
+    def post(client, url, data):
+        return lambda: client.post(url, data=data)
+
+    def emit(event_name, data):
+        def run():
+            socket.emit(event_name, data)
+            socket.get_received()
+        return run
+
+    return [
+        ('main.index', get(anonymous, '/')),
+        ('blog.index_posts', get(anonymous, '/blog/')),
+        ('blog.index_posts:member', get(member, '/blog/')),
+        ('blog.user_posts', get(anonymous, '/blog/%s/posts' % author)),
+        ('blog.show_post', get(anonymous, '/blog/show/post/%d' % post_id)),
+        ('blog.show_post:comment', post(member, '/blog/show/post/%d' % post_id, {'body': 'Benchmark comment'})),
+        ('blog.search_posts', get(anonymous, '/blog/search?q=' + term)),
+        ('blog.followers', get(member, '/blog/followers/%s' % author)),
+        ('blog.following', get(member, '/blog/following/%s' % author)),
+        ('blog.timeline_posts', get(member, '/blog/timeline')),
+        ('blog.follow_user', get(member, '/blog/follow/%s' % author)),
+        ('blog.un_follow_user', get(member, '/blog/un-follow/%s' % author)),
+        ('blog.new_post', get(member, '/blog/new/post')),
+        ('auth.login', get(anonymous, '/auth/login')),
+        ('auth.register', get(anonymous, '/auth/register')),
+        ('auth.account_recover', get(anonymous, '/auth/account/recover')),
+        ('auth.account_reset', get(anonymous, '/auth/account/reset/' + reset_token)),
+        ('auth.profile', get(member, '/auth/profile/%s' % author)),
+        ('auth.setting', get(member, '/auth/edit-profile')),
+        ('auth.index_users', get(admin, '/auth/users')),
+        ('main.cache_stats', get(admin, '/cache/stats')),
+        ('socket.rooms', get(member, '/socket/rooms')),
+        ('socket.show_room', get(member, '/socket/show/room/1')),
+        ('socket.room_messages', get(member, '/socket/room/1/messages')),
+        ('socket.online_users', get(member, '/socket/online/users')),
+        ('socket.create_room', get(member, '/socket/new/room')),
+        ('socket:join', emit('join', {'room': '1'})),
+        ('socket:message', emit('message', {'room': '1', 'message': 'Hello'})),
+        ('socket:history', emit('history', {'room': '1'})),
+        ('socket:leave', emit('leave', {'room': '1'})),
+    ]
+
+
+def measure(name, run, repeat):
+    global statements
+    response = run()
+    if response is not None and response.status_code >= 400:
+        raise AssertionError('%s answered %d' % (name, response.status_code))
+
+    # like timeit, keep collector pauses of earlier garbage out of the timings
+    timings = []
+    before = statements
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = perf_counter()
+            run()
+            timings.append(perf_counter() - started)
+    finally:
+        gc.enable()
+    queries = (statements - before) / repeat
+
+    # traced separately, tracemalloc slows down every allocation it records
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {'p50_ms': round(timings[len(timings) // 2] * 1000, 3),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+            'queries': round(queries, 2), 'peak_kib': round(peak / 1024, 1)}
+
+
+def regressions(results, baseline, latency_threshold, memory_threshold):
+    for name, result in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            yield '%s: %s queries, baseline %s' % (name, result['queries'], expected['queries'])
+        if latency_threshold is not None and result['p95_ms'] > expected['p95_ms'] * (1 + latency_threshold):
+            yield '%s: p95 %.3f ms, baseline %.3f ms' % (name, result['p95_ms'], expected['p95_ms'])
+        if memory_threshold is not None and result['peak_kib'] > expected['peak_kib'] * (1 + memory_threshold):
+            yield '%s: peak %.1f KiB, baseline %.1f KiB' % (name, result['peak_kib'], expected['peak_kib'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--follows', type=int, default=20, help='Authors followed by each user.')
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=8000)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=100, help='Messages per room.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', help='Run the scenarios whose name starts with this prefix.')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+    parser.add_argument('--latency-threshold', type=float, help='Gate on p95, allowing this relative growth, e.g. 1.0.')
+    parser.add_argument('--memory-threshold', type=float, help='Gate on the peak memory, allowing this relative growth, e.g. 0.25.')
+    arguments = parser.parse_args()
+
+    app = create_app('TEST')
+    app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+    with app.app_context():
+        db.create_all()
+        seed(arguments)
+        reader = User.query.get(2).username
+        author = User.query.order_by(User.followers_count.desc(), User.id).first().username
+        post = Post.query.order_by(Post.comments_count.desc(), Post.id).first()
+        term = post.title.split()[0]
+
+        results = {}
+        for name, run in scenarios(app, reader, author, post.id, term):
+            if arguments.only and not name.startswith(arguments.only):
+                continue
+            results[name] = measure(name, run, arguments.repeat)
+            print('%-28s p50 %8.2f ms  p95 %8.2f ms  %7.2f queries  %9.1f KiB' % (
+                name, results[name]['p50_ms'], results[name]['p95_ms'], results[name]['queries'], results[name]['peak_kib']))
+
+    parameters = {key: getattr(arguments, key) for key in ('users', 'follows', 'posts', 'comments', 'rooms', 'messages', 'seed', 'repeat')}
+    if arguments.save:
+        with open(arguments.baseline, 'w') as stream:
+            json.dump({'parameters': parameters, 'python': platform.python_version(), 'results': results}, stream, indent=2, sort_keys=True)
+            stream.write('\n')
+        return
+
+    if not path.exists(arguments.baseline):
+        print('No baseline at %s, run with --save to record one.' % arguments.baseline)
+        return
+    with open(arguments.baseline) as stream:
+        baseline = json.load(stream)
+    if baseline['parameters'] != parameters:
+        print('The baseline was recorded with %s, comparing query counts only.' % baseline['parameters'])
+        arguments.latency_threshold = arguments.memory_threshold = None
+    failures = list(regressions(results, baseline['results'], arguments.latency_threshold, arguments.memory_threshold))
+    for failure in failures:
+        print('REGRESSION ' + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
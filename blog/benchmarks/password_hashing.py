@@ -0,0 +1,43 @@
+"""Measure password checks per second, inline and through the process pool.
+
+    python -m benchmarks.password_hashing [--method pbkdf2:sha256:150000] [--logins 200] [--workers N]
+
+Each login runs from its own thread, as concurrent requests of a threaded
+worker would, and the rate is reported for the whole run and per core used.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from time import perf_counter
+from app.hashing import PasswordHasher
+
+
+def measure(name, hasher, hashed_password, logins, concurrency):
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as requests:
+        assert all(requests.map(lambda _: hasher.verify(hashed_password, 'password'), range(logins)))
+    elapsed = perf_counter() - started
+    cores = hasher.workers or 1
+    print('%-8s %2d cores %8.1f logins/s %8.1f logins/s/core' % (name, cores, logins / elapsed, logins / elapsed / cores))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--method', default='pbkdf2:sha256:150000')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=cpu_count() or 1)
+    parser.add_argument('--concurrency', type=int, default=32)
+    arguments = parser.parse_args()
+
+    hasher = PasswordHasher()
+    hasher.method = arguments.method
+    hashed_password = hasher.hash('password')
+
+    measure('inline', hasher, hashed_password, arguments.logins, arguments.concurrency)
+    hasher.workers = arguments.workers
+    hasher.hash('warm up')
+    measure('pool', hasher, hashed_password, arguments.logins, arguments.concurrency)
+
+
+if __name__ == '__main__':
+    main()
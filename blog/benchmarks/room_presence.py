@@ -0,0 +1,63 @@
+"""Compare per-room presence filtering with the batched presence query.
+
+    python -m benchmarks.room_presence [--rooms 1000] [--members 100]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db, presence
+from app.models import User, Room, RoomUserAssociation
+
+
+def seed(rooms, members, users):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [
+        {'id': index, 'username': 'user%d' % index, 'email': 'user%d@example.com' % index,
+         'last_seen': now - timedelta(minutes=rng.randint(0, 60))} for index in range(1, users + 1)])
+    db.session.execute(Room.__table__.insert(), [{'id': index, 'name': 'room %d' % index} for index in range(1, rooms + 1)])
+    db.session.execute(RoomUserAssociation.__table__.insert(), [
+        {'room_id': room_id, 'user_id': user_id}
+        for room_id in range(1, rooms + 1) for user_id in rng.sample(range(1, users + 1), members)])
+    db.session.commit()
+
+
+def per_room(rooms):
+    return {room.id: len([room_user for room_user in room.room_users if room_user.user.is_online()]) for room in rooms}
+
+
+def batched(rooms):
+    return {room_id: counts.online for room_id, counts in presence.room_presence([room.id for room in rooms]).items()}
+
+
+def measure(name, function, rooms):
+    db.session.expunge_all()
+    rooms = Room.query.filter(Room.id <= rooms).all()
+    queries = len(get_debug_queries())
+    started = perf_counter()
+    result = function(rooms)
+    elapsed = perf_counter() - started
+    print('%-10s %5d rooms %9.1f ms %7d queries' % (name, len(rooms), elapsed * 1000, len(get_debug_queries()) - queries))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--members', type=int, default=100)
+    parser.add_argument('--users', type=int, default=10000)
+    arguments = parser.parse_args()
+
+    app = create_app('TEST')
+    with app.test_request_context():
+        db.create_all()
+        seed(arguments.rooms, arguments.members, arguments.users)
+        for rooms in (app.config['FLASKY_USER_PER_PAGE'], arguments.rooms):
+            expected = measure('per-room', per_room, rooms)
+            assert measure('batched', batched, rooms) == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Compare building a serializer per call with the cached token service.
+
+    python -m benchmarks.tokens [--calls 20000]
+"""
+import argparse
+from time import perf_counter
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+from app import create_app, tokens
+
+
+def per_call(secret_key, calls):
+    for identifier in range(calls):
+        token = Serializer(secret_key, 3600).dumps({'confirm': identifier}).decode('utf-8')
+        assert Serializer(secret_key).loads(token.encode('utf8'))['confirm'] == identifier
+
+
+def cached(secret_key, calls):
+    for identifier in range(calls):
+        assert tokens.extract('confirm', tokens.generate('confirm', identifier)) == identifier
+
+
+def measure(name, function, secret_key, calls):
+    started = perf_counter()
+    function(secret_key, calls)
+    elapsed = perf_counter() - started
+    print('%-9s %7d round trips %8.2f us/call' % (name, calls, elapsed / calls * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    arguments = parser.parse_args()
+
+    app = create_app('TEST')
+    with app.app_context():
+        for name, function in (('per-call', per_call), ('cached', cached)):
+            measure(name, function, app.config['SECRET_KEY'], arguments.calls)
+
+
+if __name__ == '__main__':
+    main()
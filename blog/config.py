@@ -1,8 +1,13 @@
+import re
 from os import path, environ, curdir
 
+DEFAULT_SECRET_KEY = 'hard to guess string'
+
 
 class Config:
-    SECRET_KEY = environ.get('SECRET_KEY', 'hard to guess string')
+    SECRET_KEY = environ.get('SECRET_KEY', DEFAULT_SECRET_KEY)
+    # previous keys, comma separated, still accepted on tokens while links signed with them expire
+    SECRET_KEY_FALLBACKS = [key for key in environ.get('SECRET_KEY_FALLBACKS', '').split(',') if key]
 
     MAIL_SERVER = environ.get('MAIL_SERVER', 'smtp.googlemail.com')
     MAIL_PORT = int(environ.get('MAIL_PORT', '587'))
@@ -15,6 +20,17 @@ class Config:
     FLASKY_FOLLOWED_PER_PAGE = 10
     FLASKY_COMMENT_PER_PAGE = 10
     FLASKY_USER_PER_PAGE = 9
+    FLASKY_TIMELINE_FANOUT_LIMIT = int(environ.get('FLASKY_TIMELINE_FANOUT_LIMIT', '10000'))
+    FLASKY_TIMELINE_BACKFILL = 50
+    FLASKY_COUNT_CACHE_TTL = int(environ.get('FLASKY_COUNT_CACHE_TTL', '60'))
+
+    OUTBOX_WORKER = environ.get('OUTBOX_WORKER', 'true').lower() in ['true', 'on', '1']
+    OUTBOX_BATCH_SIZE = int(environ.get('OUTBOX_BATCH_SIZE', '50'))
+    OUTBOX_MAX_ATTEMPTS = int(environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+    OUTBOX_RETRY_DELAY = int(environ.get('OUTBOX_RETRY_DELAY', '30'))
+    OUTBOX_MAX_RETRY_DELAY = int(environ.get('OUTBOX_MAX_RETRY_DELAY', '3600'))
+    OUTBOX_POLL_INTERVAL = int(environ.get('OUTBOX_POLL_INTERVAL', '30'))
+    OUTBOX_CLAIM_TIMEOUT = int(environ.get('OUTBOX_CLAIM_TIMEOUT', '600'))
 
     FLASK_MAIL_SENDER = environ.get('FLASK_MAIL_SENDER', 'Flask Admin <flask@example.com>')
     FLASK_ADMIN = environ.get('FLASK_ADMIN')
@@ -22,46 +38,121 @@ class Config:
     TOP_LEVEL_DIR = environ.get('MEDIA_DIR', path.abspath(path.dirname(path.dirname(__file__))))
     UPLOADS_DEFAULT_DEST = path.join(TOP_LEVEL_DIR, 'media')
     UPLOADED_IMAGES_DEST = path.join(TOP_LEVEL_DIR, 'media', 'uploads')
-    IMAGES_PATH = ['media/uploads']
-
+    THUMBNAIL_CACHE_DIR = path.join(TOP_LEVEL_DIR, 'media', 'thumbnails')
+    THUMBNAIL_CACHE_URL = '/media/thumbnails'
+    THUMBNAIL_CACHE_SIZE = int(environ.get('THUMBNAIL_CACHE_SIZE', str(512 * 1024 * 1024)))
+    THUMBNAIL_RENDITIONS = [{'height': 250}, {}]
+    THUMBNAIL_WORKERS = int(environ.get('THUMBNAIL_WORKERS', '2'))
+
+    IDENTITY_CACHE_TTL = int(environ.get('IDENTITY_CACHE_TTL', '300'))
+    IDENTITY_CACHE_SIZE = int(environ.get('IDENTITY_CACHE_SIZE', '10000'))
+
+    PRESENCE_GRANULARITY = int(environ.get('PRESENCE_GRANULARITY', '60'))
+    PRESENCE_ONLINE_WINDOW = int(environ.get('PRESENCE_ONLINE_WINDOW', '120'))
+    PRESENCE_FLUSH_INTERVAL = int(environ.get('PRESENCE_FLUSH_INTERVAL', '30'))
+    PRESENCE_FLUSH_SIZE = int(environ.get('PRESENCE_FLUSH_SIZE', '100'))
+
+    # redis://..., amqp://... or local://host:port served by flask socketio-broker
+    SOCKETIO_MESSAGE_QUEUE = environ.get('SOCKETIO_MESSAGE_QUEUE')
+    # the local:// broker unpickles what it receives, only let it off the loopback interface on a private network
+    SOCKETIO_BROKER_ALLOW_REMOTE = environ.get('SOCKETIO_BROKER_ALLOW_REMOTE', 'false').lower() in ['true', 'on', '1']
+
+    CHAT_FLUSH_INTERVAL = float(environ.get('CHAT_FLUSH_INTERVAL', '0.25'))
+    CHAT_FLUSH_SIZE = int(environ.get('CHAT_FLUSH_SIZE', '500'))
+    CHAT_FLUSH_ATTEMPTS = int(environ.get('CHAT_FLUSH_ATTEMPTS', '5'))
+    CHAT_BUFFER_LIMIT = int(environ.get('CHAT_BUFFER_LIMIT', '10000'))
+    CHAT_HISTORY_PER_PAGE = 30
+
+    HTTP_CACHE_MAX_AGE = int(environ.get('HTTP_CACHE_MAX_AGE', '60'))
+
+    FRAGMENT_CACHE_SIZE = int(environ.get('FRAGMENT_CACHE_SIZE', '5000'))
+    FRAGMENT_CACHE_DIR = environ.get('FRAGMENT_CACHE_DIR')
+    FRAGMENT_CACHE_DIR_SIZE = int(environ.get('FRAGMENT_CACHE_DIR_SIZE', str(256 * 1024 * 1024)))
+
+    PASSWORD_HASH_METHOD = environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:150000')
+    # per process, every one of the 10 uwsgi processes runs its own pool, keep their sum near the cores
+    PASSWORD_HASH_WORKERS = int(environ.get('PASSWORD_HASH_WORKERS', '1'))
+    FIXTURES_PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+    SEARCH_INDEX_PATH = environ.get('SEARCH_INDEX_PATH', path.join(TOP_LEVEL_DIR, 'db', 'search.sqlite'))
+
+    # the share of requests that also time their statements and templates, every request is counted
+    METRICS_SAMPLE_RATE = float(environ.get('METRICS_SAMPLE_RATE', '0.1'))
+    METRICS_SLOW_REQUEST_TIME = float(environ.get('METRICS_SLOW_REQUEST_TIME', '1.0'))
+    METRICS_SLOW_STATEMENTS = 5
+    # where the uwsgi workers add up their figures for /metrics, unset serves only the answering process's
+    METRICS_DIR = environ.get('METRICS_DIR')
+    METRICS_WRITE_INTERVAL = float(environ.get('METRICS_WRITE_INTERVAL', '5'))
+
+    # under uwsgi gevent mode, log and count the calls that hold the hub longer than this, 0 disables
+    GEVENT_MAX_BLOCKING_TIME = float(environ.get('GEVENT_MAX_BLOCKING_TIME', '0.1'))
+
+    # read-only views read from one of these, comma separated
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in environ.get('SQLALCHEMY_REPLICA_URIS', '').split(',') if uri]
+    # per process, 10 uwsgi processes of pool_size + max_overflow connections must fit in max_connections
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(environ.get('SQLALCHEMY_POOL_SIZE', '5')),
+        'max_overflow': int(environ.get('SQLALCHEMY_MAX_OVERFLOW', '10')),
+        'pool_timeout': int(environ.get('SQLALCHEMY_POOL_TIMEOUT', '10')),
+        'pool_recycle': int(environ.get('SQLALCHEMY_POOL_RECYCLE', '3600')),
+        'pool_pre_ping': environ.get('SQLALCHEMY_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1'],
+    }
+    # laid over SQLALCHEMY_ENGINE_OPTIONS per bind key, 'replica' applies to every replica
+    SQLALCHEMY_BIND_ENGINE_OPTIONS = {
+        'replica': {
+            'pool_size': int(environ.get('SQLALCHEMY_REPLICA_POOL_SIZE', '5')),
+            'max_overflow': int(environ.get('SQLALCHEMY_REPLICA_MAX_OVERFLOW', '10')),
+        },
+    }
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_RECORD_QUERIES = True
+    SQLALCHEMY_RECORD_QUERIES = False
 
     @classmethod
     def init_app(cls, app):
         pass
 
+    @classmethod
+    def init_web_app(cls, app):
+        pass
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
     DEBUG_TB_INTERCEPT_REDIRECTS = False
 
     SQLALCHEMY_DATABASE_URI = environ.get('DEV_DATABASE_URL', 'sqlite:///' +  path.join(Config.TOP_LEVEL_DIR, 'db', 'data-dev.sqlite'))
-    SQLALCHEMY_SLOW_DB_QUERY_TIME = 0.5
+    # the debug toolbar lists the queries of a request
+    SQLALCHEMY_RECORD_QUERIES = True
+    METRICS_SAMPLE_RATE = 1.0
+    METRICS_SLOW_REQUEST_TIME = 0.5
 
     @classmethod
-    def init_app(cls, app):
+    def init_web_app(cls, app):
         from flask_debugtoolbar import DebugToolbarExtension
 
         debug = DebugToolbarExtension()
         debug.init_app(app)
 
-        @app.after_app_request
-        def after_request(response):
-            for query in get_debug_queries():
-                if query.duration >= current_app.config['FLASK_SLOW_DB_QUERY_TIME']:
-                    current_app.logger.warning('Slow query: %s\nParameters: %s\nDuration: %fs\nContext: %s\n' % (query.statement, query.parameters, query.duration, query.context))
-            return response
-
 
 class TestingConfig(Config):
     TESTING = True
+    WTF_CSRF_ENABLED = False
+    OUTBOX_WORKER = False
+    CHAT_FLUSH_INTERVAL = 0
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
+    PASSWORD_HASH_WORKERS = 0
+    SQLALCHEMY_RECORD_QUERIES = True
+    METRICS_SAMPLE_RATE = 0
 
-    SQLALCHEMY_DATABASE_URI = environ.get('TEST_DATABASE_URL', 'sqlite:///' +  path.join(Config.TOP_LEVEL_DIR, 'db', 'data-test.sqlite'))
+    SQLALCHEMY_DATABASE_URI = environ.get('TEST_DATABASE_URL', 'sqlite://')
+    SEARCH_INDEX_PATH = ':memory:'
 
 
 class ProductionConfig(Config):
-    SQLALCHEMY_DATABASE_URI = environ.get('DATABASE_URL', 'sqlite:///' +  path.join(Config.TOP_LEVEL_DIR, 'db', 'data.sqlite'))
+    # PyMySQL is pure Python and yields under gevent, MySQLdb and the C extension of mysql-connector hold the whole worker
+    SQLALCHEMY_DATABASE_URI = re.sub(r'^mysql(\+mysqlconnector)?://', 'mysql+pymysql://',
+                                     environ.get('DATABASE_URL', 'sqlite:///' +  path.join(Config.TOP_LEVEL_DIR, 'db', 'data.sqlite')))
+    METRICS_DIR = environ.get('METRICS_DIR', path.join(Config.TOP_LEVEL_DIR, 'db', 'metrics'))
 
     @classmethod
     def init_app(cls, app):
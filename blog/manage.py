@@ -1,12 +1,14 @@
 import os
+import sys
+import click
 from flask_migrate import upgrade
-from app import fixtures, create_app, db, socket_io
-from app.models import User, Role, Permission
-from flask_sqlalchemy import get_debug_queries
-from flask import current_app
+from app import counters, timeline, create_app, db, search, thumbnails, outbox
+from app.models import User, Role, Permission, Post
 
+# only the commands serving or listing the views need them, every other one starts without
+WEB_COMMANDS = {'run', 'routes', 'shell'}
 
-app = create_app(os.getenv('FLASK_CONFIG', 'DEFAULT'))
+app = create_app(os.getenv('FLASK_CONFIG', 'DEFAULT'), web=__name__ == '__main__' or bool(WEB_COMMANDS.intersection(sys.argv[1:2])))
 
 
 @app.cli.command()
@@ -15,8 +17,60 @@ def migrate_database():
 
 
 @app.cli.command()
-def load_fixtures():
-    fixtures.exec_fixtures()
+@click.option('--users', default=100, help='Number of users to create.')
+@click.option('--posts', default=100, help='Number of posts to create.')
+@click.option('--comments', default=400, help='Number of comments spread over the new posts.')
+@click.option('--seed', type=int, default=None, help='Seed of the generator, for repeatable data sets.')
+@click.option('--password', default='123456', help='Password of every generated user.')
+@click.option('--password-hash', default=None, help='Precomputed hash used instead of hashing --password.')
+@click.option('--batch-size', default=10000, help='Rows per INSERT.')
+def load_fixtures(users, posts, comments, seed, password, password_hash, batch_size):
+    """Seed the database with generated users, posts and comments."""
+    from app import fixtures
+    fixtures.exec_fixtures(users=users, posts=posts, comments=comments, seed=seed, password=password,
+                           password_hash=password_hash, batch_size=batch_size)
+
+
+@app.cli.command()
+def recount():
+    """Recompute the denormalized follower, post and comment counters."""
+    counters.recount()
+
+
+@app.cli.command()
+def backfill_timeline():
+    """Rebuild the materialized follower timelines."""
+    timeline.backfill()
+
+
+@app.cli.command()
+def reindex():
+    """Rebuild the full-text search index."""
+    search.reindex()
+
+
+@app.cli.command()
+def warm_thumbnails():
+    """Render the thumbnails of every uploaded post image."""
+    thumbnails.warm(filename for filename, in db.session.query(Post.image_filename).filter(Post.image_filename.isnot(None)))
+
+
+@app.cli.command()
+def deliver_mail():
+    """Send every due message in the mail outbox."""
+    outbox.deliver_all()
+
+
+@app.cli.command()
+def socketio_broker():
+    """Run the broker behind a local:// Socket.IO message queue."""
+    from app.socket.broker import Broker
+    try:
+        broker = Broker(app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SECRET_KEY'].encode('utf-8'),
+                        app.config['SOCKETIO_BROKER_ALLOW_REMOTE'])
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    broker.serve_forever()
 
 
 @app.cli.command()
@@ -0,0 +1,33 @@
+"""timeline entries
+
+Revision ID: 01cb8494e49f
+Revises: e176bb787d61
+Create Date: 2026-10-18 10:41:05.527930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '01cb8494e49f'
+down_revision = 'e176bb787d61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline_entries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.create_index('ix_timeline_entries_user_id_timestamp_post_id', 'timeline_entries', ['user_id', 'timestamp', 'post_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_timeline_entries_user_id_timestamp_post_id', table_name='timeline_entries')
+    op.drop_table('timeline_entries')
@@ -0,0 +1,44 @@
+"""outbox messages
+
+Revision ID: 23e5795d5a40
+Revises: 01cb8494e49f
+Create Date: 2026-10-18 11:52:17.204113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '23e5795d5a40'
+down_revision = '01cb8494e49f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sender', sa.String(length=254), nullable=True),
+    sa.Column('recipients', sa.Text(), nullable=True),
+    sa.Column('subject', sa.String(length=255), nullable=True),
+    sa.Column('body', sa.Text(), nullable=True),
+    sa.Column('html', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('claim', sa.String(length=32), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_outbox_messages_claim'), 'outbox_messages', ['claim'], unique=False)
+    op.create_index('ix_outbox_messages_status_next_attempt_at', 'outbox_messages', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_messages_status_next_attempt_at', table_name='outbox_messages')
+    op.drop_index(op.f('ix_outbox_messages_claim'), table_name='outbox_messages')
+    op.drop_table('outbox_messages')
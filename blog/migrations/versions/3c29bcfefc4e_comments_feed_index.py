@@ -0,0 +1,24 @@
+"""comments feed index
+
+Revision ID: 3c29bcfefc4e
+Revises: fc4213a6d28c
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c29bcfefc4e'
+down_revision = 'fc4213a6d28c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_comments_post_id_disabled_timestamp', 'comments', ['post_id', 'disabled', 'timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_comments_post_id_disabled_timestamp', table_name='comments')
@@ -0,0 +1,30 @@
+"""used tokens
+
+Revision ID: 510b645b7b75
+Revises: f9bc4b0e0b6f
+Create Date: 2026-10-18 15:02:41.318804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '510b645b7b75'
+down_revision = 'f9bc4b0e0b6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('used_tokens',
+    sa.Column('jti', sa.String(length=32), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index(op.f('ix_used_tokens_expires_at'), 'used_tokens', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_used_tokens_expires_at'), table_name='used_tokens')
+    op.drop_table('used_tokens')
@@ -0,0 +1,35 @@
+"""messages
+
+Revision ID: 5954031536e9
+Revises: 23e5795d5a40
+Create Date: 2026-10-18 12:37:48.910233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5954031536e9'
+down_revision = '23e5795d5a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('room_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.Column('body', sa.Text(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_messages_room_id_id', 'messages', ['room_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_messages_room_id_id', table_name='messages')
+    op.drop_table('messages')
@@ -0,0 +1,29 @@
+"""content versions
+
+Revision ID: 6a068c27ee42
+Revises: 95e680f2c194
+Create Date: 2026-10-18 19:02:41.318529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a068c27ee42'
+down_revision = '95e680f2c194'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('content_versions',
+                    sa.Column('name', sa.String(length=32), nullable=False),
+                    sa.Column('version', sa.Integer(), nullable=False),
+                    sa.Column('updated_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('name'))
+    op.execute("INSERT INTO content_versions (name, version, updated_at) VALUES ('posts', 1, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    op.drop_table('content_versions')
@@ -0,0 +1,34 @@
+"""hot path indexes
+
+Revision ID: 95e680f2c194
+Revises: 510b645b7b75
+Create Date: 2026-10-18 16:21:09.774215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '95e680f2c194'
+down_revision = '510b645b7b75'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_posts_author_id_timestamp_id', 'posts', ['author_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_follows_follower_id_timestamp', 'follows', ['follower_id', 'timestamp'], unique=False)
+    op.create_index('ix_follows_followed_id_timestamp', 'follows', ['followed_id', 'timestamp'], unique=False)
+    op.create_index('ix_rooms_users_room_id_user_id', 'rooms_users', ['room_id', 'user_id'], unique=False)
+    op.create_index(op.f('ix_users_last_seen'), 'users', ['last_seen'], unique=False)
+    op.create_index(op.f('ix_users_deleted_at'), 'users', ['deleted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_users_deleted_at'), table_name='users')
+    op.drop_index(op.f('ix_users_last_seen'), table_name='users')
+    op.drop_index('ix_rooms_users_room_id_user_id', table_name='rooms_users')
+    op.drop_index('ix_follows_followed_id_timestamp', table_name='follows')
+    op.drop_index('ix_follows_follower_id_timestamp', table_name='follows')
+    op.drop_index('ix_posts_author_id_timestamp_id', table_name='posts')
@@ -0,0 +1,28 @@
+"""fragment versions
+
+Revision ID: ce25d550d2ab
+Revises: 5954031536e9
+Create Date: 2026-10-18 13:26:40.118392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ce25d550d2ab'
+down_revision = '5954031536e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('users', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,42 @@
+"""counters
+
+Revision ID: e176bb787d61
+Revises: 3c29bcfefc4e
+Create Date: 2026-10-18 10:02:47.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e176bb787d61'
+down_revision = '3c29bcfefc4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('posts_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute('UPDATE users SET '
+               'followers_count = (SELECT count(*) FROM follows WHERE follows.follower_id = users.id), '
+               'following_count = (SELECT count(*) FROM follows WHERE follows.followed_id = users.id), '
+               'posts_count = (SELECT count(*) FROM posts WHERE posts.author_id = users.id), '
+               'comments_count = (SELECT count(*) FROM comments WHERE comments.author_id = users.id)')
+    op.execute('UPDATE posts SET '
+               'comments_count = (SELECT count(*) FROM comments WHERE comments.post_id = posts.id AND comments.disabled = 0)')
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('comments_count')
+        batch_op.drop_column('posts_count')
+        batch_op.drop_column('following_count')
+        batch_op.drop_column('followers_count')
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('comments_count')
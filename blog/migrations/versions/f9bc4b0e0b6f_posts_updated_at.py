@@ -0,0 +1,26 @@
+"""posts updated at
+
+Revision ID: f9bc4b0e0b6f
+Revises: ce25d550d2ab
+Create Date: 2026-10-18 14:08:12.551870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f9bc4b0e0b6f'
+down_revision = 'ce25d550d2ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE posts SET updated_at = timestamp')
+
+
+def downgrade():
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('updated_at')
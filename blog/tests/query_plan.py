@@ -0,0 +1,63 @@
+"""Finds the full table scans in the SELECTs an endpoint issues on SQLite.
+
+    with QueryPlanChecker(db, min_rows=100) as checker:
+        client.get('/blog/')
+    assert checker.scans() == []
+
+Each captured SELECT is run again under EXPLAIN QUERY PLAN. A SCAN step on a
+table holding more than min_rows rows is reported, whether it reads the
+table or walks one of its indexes, unless the statement is an unfiltered
+page: a LIMIT with neither a WHERE clause nor a temporary b-tree for the
+ORDER BY stops after the page. Deliberate scans are allowed by name: allowed
+maps a statement prefix to the reason it may scan.
+"""
+import re
+from sqlalchemy import event
+
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(.*)$')
+
+
+class QueryPlanChecker(object):
+
+    def __init__(self, db, min_rows=100, allowed=None):
+        self.db = db
+        self.min_rows = min_rows
+        self.allowed = allowed or {}
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.db.engine, 'before_cursor_execute', self._capture)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.db.engine, 'before_cursor_execute', self._capture)
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            self.statements.append((statement, parameters))
+
+    def plan(self, statement, parameters):
+        return [row[-1] for row in self.db.engine.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+    def scans(self):
+        """(table, rows, plan step, statement) of every full scan of a table above min_rows."""
+        sizes = {}
+        found = []
+        for statement, parameters in self.statements:
+            plan = self.plan(statement, parameters)
+            statement = ' '.join(statement.split())
+            if any(statement.startswith(prefix) for prefix in self.allowed):
+                continue
+            paginated = ' LIMIT ' in statement and ' WHERE ' not in statement and not any('FOR ORDER BY' in step for step in plan)
+            for step in plan:
+                match = SCAN.match(step)
+                if match is None or paginated:
+                    continue
+                table = match.group(1)
+                if table not in self.db.metadata.tables:
+                    continue
+                if table not in sizes:
+                    sizes[table] = self.db.engine.execute('SELECT count(*) FROM "%s"' % table).scalar()
+                if sizes[table] > self.min_rows:
+                    found.append((table, sizes[table], step, statement))
+        return found
@@ -6,7 +6,7 @@ from app import create_app, db
 class BasicsTestCase(unittest.TestCase):
 
     def setUp(self):
-        self.app = create_app('testing')
+        self.app = create_app('TEST')
         self.app_context = self.app.app_context()
         self.app_context.push()
         db.create_all()
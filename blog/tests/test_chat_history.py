@@ -0,0 +1,58 @@
+import unittest
+from os import getpid
+from app import create_app, db, chat
+from app.models import User, Room, Message
+from app.socket.views import message_history
+
+
+class ChatHistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.test_request_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add_all([User(username='john', email='john@example.com', first_name='John', last_name='Doe'), Room(name='lobby')])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_buffered_messages_are_written_in_bulk(self):
+        # pretend the writer task already runs so that only the size limit flushes
+        chat.interval, chat.size, chat._pid = 60, 3, getpid()
+        chat.add(1, 1, 'one')
+        chat.add(1, 1, 'two')
+        self.assertEqual(Message.query.count(), 0)
+        chat.add(1, 1, 'three')
+        self.assertEqual(Message.query.count(), 3)
+
+    def test_rejected_message_does_not_block_the_others(self):
+        chat.interval, chat.size, chat._pid = 60, 3, getpid()
+        chat.add(1, 1, 'one')
+        chat.add(None, 1, 'no room')
+        chat.add(1, 1, 'two')
+        self.assertEqual([message.body for message in Message.query.order_by(Message.id)], ['one', 'two'])
+        self.assertEqual(chat._pending, [])
+
+    def test_buffer_drops_the_oldest_messages_beyond_its_limit(self):
+        chat.interval, chat.size, chat.limit, chat._pid = 60, 10, 2, getpid()
+        for body in ('one', 'two', 'three'):
+            chat.add(1, 1, body)
+        self.assertEqual([message['body'] for _, message in chat._pending], ['two', 'three'])
+        chat.flush()
+        self.assertEqual(Message.query.count(), 2)
+
+    def test_history_is_paginated_newest_first(self):
+        self.app.config['CHAT_HISTORY_PER_PAGE'] = 2
+        for index in range(3):
+            chat.add(1, 1, 'message %d' % index)
+
+        first = message_history(1, None)
+        self.assertEqual([message['message'] for message in first['messages']], ['message 2', 'message 1'])
+        self.assertEqual(first['messages'][0]['user_full_name'], 'John Doe')
+        second = message_history(1, first['next_cursor'])
+        self.assertEqual([message['message'] for message in second['messages']], ['message 0'])
+        self.assertIsNone(second['next_cursor'])
@@ -0,0 +1,87 @@
+import re
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Post, Role, Comment, Permission, AnonymousUser
+
+BASIC = Permission.FOLLOW | Permission.COMMENT | Permission.WRITE
+
+
+class CommentFeedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        roles = {'user': Role(name='User', default=True, permissions=BASIC),
+                 'moderator': Role(name='Moderator', permissions=BASIC | Permission.MODERATE),
+                 'admin': Role(name='Administrator', permissions=BASIC | Permission.MODERATE | Permission.ADMIN)}
+        self.users = {name: User(username=name, email='%s@example.com' % name, password='cat', role=role, about_me='')
+                      for name, role in roles.items()}
+        self.post = Post(title='Title', body='Body', author=self.users['user'])
+        db.session.add_all(list(self.users.values()) + [self.post])
+        # every third comment is disabled, pairs share a timestamp so the id breaks the tie
+        start = datetime(2020, 1, 1)
+        db.session.add_all([Comment(body='comment-%02d' % index, post=self.post, author=self.users['user'], disabled=index % 3 == 0,
+                                    timestamp=start + timedelta(minutes=index // 2)) for index in range(25)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def enabled(self):
+        return ['comment-%02d' % index for index in range(25) if index % 3]
+
+    def everything(self):
+        return ['comment-%02d' % index for index in range(25)]
+
+    def client(self, name):
+        client = self.app.test_client()
+        if name is not None:
+            client.post('/auth/login', data={'username': name, 'password': 'cat'})
+        return client
+
+    def walk(self, client, cursor=None):
+        """The comment bodies of every page, following the next links from the first page."""
+        pages = []
+        while True:
+            url = '/blog/show/post/%d' % self.post.id + ('?cursor=' + cursor if cursor else '')
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            html = response.get_data(as_text=True)
+            pages.append(re.findall(r'comment-\d\d', html))
+            match = re.search(r'href="[^"]*\?cursor=([\w-]+)">\s*&raquo;', html)
+            if match is None:
+                return pages
+            cursor = match.group(1)
+
+    def test_disabled_comments_are_only_shown_to_moderators(self):
+        for viewer, expected in ((AnonymousUser(), self.enabled()), (self.users['user'], self.enabled()),
+                                 (self.users['moderator'], self.everything()), (self.users['admin'], self.everything())):
+            self.assertEqual(sorted(comment.body for comment in Comment.feed(self.post, viewer)), expected)
+
+    def test_pages_neither_repeat_nor_skip(self):
+        for name, expected in ((None, self.enabled()), ('user', self.enabled()), ('moderator', self.everything()), ('admin', self.everything())):
+            pages = self.walk(self.client(name))
+            self.assertGreater(len(pages), 1)
+            self.assertTrue(all(len(page) <= self.app.config['FLASKY_COMMENT_PER_PAGE'] for page in pages))
+            self.assertEqual([body for page in pages for body in page], expected)
+
+    def test_previous_page(self):
+        client = self.client(None)
+        pages = self.walk(client)
+        html = client.get('/blog/show/post/%d' % self.post.id).get_data(as_text=True)
+        second = client.get('/blog/show/post/%d?cursor=%s' % (self.post.id, re.search(r'\?cursor=([\w-]+)">\s*&raquo;', html).group(1)))
+        previous = re.search(r'href="[^"]*\?cursor=([\w-]+)">\s*&laquo;', second.get_data(as_text=True)).group(1)
+        html = client.get('/blog/show/post/%d?cursor=%s' % (self.post.id, previous)).get_data(as_text=True)
+        self.assertEqual(re.findall(r'comment-\d\d', html), pages[0])
+
+    def test_bad_cursor_falls_back_to_the_first_page(self):
+        first = self.walk(self.client(None))[0]
+        for cursor in ('garbage', 'eyJiIjpmYWxzZX0', 'eyJiIjpmYWxzZSwiayI6WzFdfQ'):
+            response = self.client(None).get('/blog/show/post/%d?cursor=%s' % (self.post.id, cursor))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(re.findall(r'comment-\d\d', response.get_data(as_text=True)), first)
@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+from app import create_app, concurrency
+from app.concurrency import cooperative, thread_pool
+
+try:
+    import gevent
+except ImportError:
+    gevent = None
+
+
+class ConcurrencyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_plain_threads_without_gevent(self):
+        self.assertFalse(cooperative())
+        with thread_pool(1) as executor:
+            self.assertEqual(executor.submit(sum, [1, 2]).result(), 3)
+
+    @unittest.skipIf(gevent is None, 'gevent is not installed')
+    def test_patched_worker_starts_the_monitor(self):
+        # as wsgi.py does: patch, build the app, then start the monitor in the forked worker
+        script = ('from gevent import monkey; monkey.patch_all()\n'
+                  'from app import create_app, concurrency\n'
+                  'from app.concurrency import thread_pool\n'
+                  'app = create_app("TEST")\n'
+                  'print(concurrency.start() is not None, type(thread_pool(1)).__module__)')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + sys.path))
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=root, env=env, universal_newlines=True)
+        self.assertEqual(output.split(), ['True', 'gevent.threadpool'])
+
+    @unittest.skipIf(gevent is None, 'gevent is not installed')
+    def test_blocking_call_is_logged_and_counted(self):
+        self.app.config['GEVENT_MAX_BLOCKING_TIME'] = 0.05
+        concurrency.init_app(self.app)
+        monitor = concurrency.monitor()
+        blocked = concurrency.blocked
+        try:
+            with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                # the unpatched sleep holds the hub like any blocking call would
+                gevent.spawn(time.sleep, 0.5).join()
+                gevent.sleep(0.1)
+        finally:
+            monitor.kill()
+
+        self.assertGreater(concurrency.blocked, blocked)
+        self.assertIn('Event loop blocked', logs.output[0])
+        self.assertIn('blog_event_loop_blocked_total %d' % concurrency.blocked,
+                      self.app.test_client().get('/metrics').get_data(as_text=True))
+
+    @unittest.skipIf(gevent is None, 'gevent is not installed')
+    def test_wsgi_patches_under_uwsgi_gevent(self):
+        # uWSGI puts its module in sys.modules, it is not a builtin one
+        script = ('import sys, types\n'
+                  'sys.modules["uwsgi"] = types.SimpleNamespace(opt={"gevent": b"1000"}, masterpid=lambda: 1)\n'
+                  'import wsgi\n'
+                  'from app import socket_io\n'
+                  'from app.concurrency import cooperative\n'
+                  'print(cooperative(), socket_io.server.async_mode)')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + sys.path), FLASK_CONFIG='TEST')
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=root, env=env, universal_newlines=True)
+        self.assertEqual(output.split()[-2:], ['True', 'gevent_uwsgi'])
@@ -0,0 +1,113 @@
+import unittest
+from datetime import datetime, timedelta
+from flask_sqlalchemy import get_debug_queries
+from werkzeug.http import http_date
+from app import create_app, db
+from app.models import User, Post, Role, Comment, ContentVersion
+
+
+class ConditionalGetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        db.session.add(Post(title='First', body='Body', author=User(username='john', email='john@example.com', about_me='')))
+        db.session.commit()
+        self._backdate()
+        self.client = self.app.test_client()
+
+    def _backdate(self):
+        # Last-Modified is only sent once the second of the last change is over
+        earlier = datetime.utcnow() - timedelta(minutes=1)
+        for table in (Post.__table__, ContentVersion.__table__):
+            db.session.execute(table.update().values(updated_at=earlier))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_revalidation_answers_304_from_the_validators(self):
+        for url in ('/blog/', '/blog/john/posts', '/blog/show/post/1'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('public', response.headers['Cache-Control'])
+            etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+            before = len(get_debug_queries())
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertLessEqual(len(get_debug_queries()) - before, 2)
+
+            response = self.client.get(url, headers={'If-Modified-Since': last_modified})
+            self.assertEqual(response.status_code, 304)
+
+    def test_changes_produce_a_new_etag(self):
+        etag = self.client.get('/blog/show/post/1').headers['ETag']
+        db.session.add(Comment(body='Nice', post_id=1, author_id=1))
+        Post.increment(1, comments_count=1)
+        db.session.commit()
+        self.assertEqual(self.client.get('/blog/show/post/1', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_deleting_a_post_moves_the_listing_validators(self):
+        db.session.add(Post(title='Second', body='Body', author_id=1))
+        db.session.commit()
+        self._backdate()
+        response = self.client.get('/blog/')
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+        db.session.delete(Post.query.get(2))
+        db.session.commit()
+        self.assertEqual(self.client.get('/blog/', headers={'If-None-Match': etag}).status_code, 200)
+        self.assertNotEqual(self.client.get('/blog/').headers['ETag'], etag)
+
+    def test_comments_keep_the_listing_version(self):
+        before = ContentVersion.current('posts')
+        post = Post.query.get(1)
+        post.comments.append(Comment(body='Nice', author_id=1))
+        db.session.commit()
+        self.assertEqual(ContentVersion.current('posts'), before)
+
+        post.title = 'Renamed'
+        db.session.commit()
+        self.assertGreater(ContentVersion.current('posts')[1], before[1])
+
+    def test_author_edits_move_the_listing_version(self):
+        before = ContentVersion.current('posts')
+        user = User.query.get(1)
+        user.first_name, user.version = 'Johnny', User.version + 1
+        db.session.commit()
+        self.assertGreater(ContentVersion.current('posts')[1], before[1])
+
+    def test_user_posts_loads_the_user_once(self):
+        before = len(get_debug_queries())
+        self.client.get('/blog/john/posts')
+        users = [query for query in get_debug_queries()[before:] if query.statement.lstrip().startswith('SELECT users.')]
+        self.assertEqual(len(users), 1)
+
+    def test_commenter_edits_produce_a_new_etag(self):
+        db.session.add(User(username='susan', email='susan@example.com', about_me=''))
+        db.session.add(Comment(body='Nice', post_id=1, author_id=2))
+        db.session.commit()
+        etag = self.client.get('/blog/show/post/1').headers['ETag']
+
+        user = User.query.get(2)
+        user.first_name, user.version = 'Sue', User.version + 1
+        db.session.commit()
+        self.assertEqual(self.client.get('/blog/show/post/1', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_no_last_modified_within_the_second_of_a_change(self):
+        last_modified = self.client.get('/blog/').headers['Last-Modified']
+        db.session.add(Post(title='Second', body='Body', author_id=1))
+        db.session.commit()
+
+        # the header has whole seconds, a write later in the same second would not move it
+        response = self.client.get('/blog/', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response.headers)
+        response = self.client.get('/blog/', headers={'If-Modified-Since': http_date(datetime.utcnow())})
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,107 @@
+import io
+import shutil
+import tempfile
+import unittest
+from flask_uploads import UploadConfiguration
+from app import create_app, db, counters, thumbnails
+from app.models import User, Post, Role, Comment, Permission
+
+COUNTERS = ('followers_count', 'following_count', 'posts_count', 'comments_count')
+
+
+class CountersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from PIL import Image
+
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app('TEST')
+        self.app.upload_set_config['images'] = UploadConfiguration(self.directory)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        thumbnails.renditions = []
+        db.create_all()
+        # moderating comments takes both ADMIN and MODERATE
+        role = Role(name='Administrator', default=True, permissions=Permission.FOLLOW | Permission.COMMENT | Permission.WRITE |
+                    Permission.MODERATE | Permission.ADMIN)
+        db.session.add_all([User(username=name, email='%s@example.com' % name, password='cat', role=role) for name in ('john', 'susan')])
+        db.session.commit()
+
+        image = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(image, 'PNG')
+        self.image = image.getvalue()
+        self.john = self.login('john')
+        self.susan = self.login('susan')
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.directory)
+
+    def login(self, username):
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': username, 'password': 'cat'})
+        return client
+
+    def counts(self):
+        db.session.remove()
+        users = {user.username: {counter: getattr(user, counter) for counter in COUNTERS} for user in User.query}
+        posts = {post.id: post.comments_count for post in Post.query}
+        return users, posts
+
+    def assertCounts(self, users, posts):
+        """The counters kept by the views are the expected ones and those a recount finds."""
+        kept = self.counts()
+        self.assertEqual(kept, (users, posts))
+        counters.recount()
+        self.assertEqual(self.counts(), kept)
+
+    def user(self, **counts):
+        return dict(dict.fromkeys(COUNTERS, 0), **counts)
+
+    def new_post(self, client):
+        response = client.post('/blog/new/post', data={'title': 'Title', 'body': 'Body', 'file': (io.BytesIO(self.image), 'image.png')})
+        self.assertEqual(response.status_code, 302)
+        return Post.query.order_by(Post.id.desc()).first().id
+
+    def comment(self, client, post_id):
+        self.assertEqual(client.post('/blog/show/post/%d' % post_id, data={'body': 'Comment'}).status_code, 302)
+        return Comment.query.order_by(Comment.id.desc()).first().id
+
+    def test_follow_and_unfollow(self):
+        self.john.get('/blog/follow/susan')
+        self.john.get('/blog/follow/susan')
+        self.assertCounts({'john': self.user(following_count=1), 'susan': self.user(followers_count=1)}, {})
+
+        self.john.get('/blog/un-follow/susan')
+        self.john.get('/blog/un-follow/susan')
+        self.assertCounts({'john': self.user(), 'susan': self.user()}, {})
+
+    def test_create_and_delete_posts(self):
+        first, second = self.new_post(self.john), self.new_post(self.john)
+        self.assertCounts({'john': self.user(posts_count=2), 'susan': self.user()}, {first: 0, second: 0})
+
+        self.assertEqual(self.john.post('/blog/delete/post/%d' % first).status_code, 302)
+        self.assertCounts({'john': self.user(posts_count=1), 'susan': self.user()}, {second: 0})
+
+    def test_add_and_disable_comments(self):
+        post_id = self.new_post(self.john)
+        self.comment(self.susan, post_id)
+        comment_id = self.comment(self.susan, post_id)
+        self.assertCounts({'john': self.user(posts_count=1), 'susan': self.user(comments_count=2)}, {post_id: 2})
+
+        # a disabled comment leaves its post's count but still counts for its author
+        self.john.post('/blog/comment/disable/%d' % comment_id)
+        self.john.post('/blog/comment/disable/%d' % comment_id)
+        self.assertCounts({'john': self.user(posts_count=1), 'susan': self.user(comments_count=2)}, {post_id: 1})
+
+        self.john.post('/blog/comment/enable/%d' % comment_id)
+        self.assertCounts({'john': self.user(posts_count=1), 'susan': self.user(comments_count=2)}, {post_id: 2})
+
+    def test_deleting_a_commented_post(self):
+        post_id = self.new_post(self.john)
+        self.comment(self.susan, post_id)
+        self.john.post('/blog/delete/post/%d' % post_id)
+        # the comment outlives its post, detached from it, and still counts for its author
+        self.assertCounts({'john': self.user(), 'susan': self.user(comments_count=1)}, {})
@@ -0,0 +1,33 @@
+import unittest
+from sqlalchemy import func
+from app import create_app, db, fixtures
+from app.models import User, Post, Comment
+
+
+class FixturesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_bulk_load(self):
+        fixtures.exec_fixtures(users=30, posts=200, comments=800, seed=1, password_hash='precomputed', batch_size=64)
+
+        self.assertEqual(User.query.count(), 31)
+        self.assertEqual(Post.query.count(), 200)
+        self.assertEqual(Comment.query.count(), 800)
+        self.assertEqual(User.query.filter_by(hashed_password='precomputed').count(), 30)
+        self.assertEqual(db.session.query(func.sum(User.posts_count)).scalar(), 200)
+        self.assertEqual(db.session.query(func.sum(Post.comments_count)).scalar(), 800)
+
+        # a second run adds to the data set instead of colliding with it
+        fixtures.exec_fixtures(users=5, posts=10, comments=10, seed=1, password_hash='precomputed')
+        self.assertEqual(User.query.count(), 36)
+        self.assertEqual(Post.query.count(), 210)
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+from app import create_app, db, fragments
+from app.models import User, Post, Role
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        author = User(username='john', email='john@example.com', first_name='John', last_name='Doe')
+        db.session.add_all([Post(title='First', body='Body', author=author), Post(title='Second', body='Body', author=author)])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_cards_are_reused_until_their_version_changes(self):
+        self.client.get('/blog/')
+        self.assertEqual(fragments.stats()['misses'], 2)
+        self.client.get('/blog/')
+        self.assertEqual(fragments.stats()['hits'], 2)
+
+        Post.increment(1, version=1)
+        db.session.commit()
+        self.assertIn(b'First', self.client.get('/blog/').data)
+        self.assertEqual((fragments.stats()['hits'], fragments.stats()['misses']), (3, 3))
+
+    def test_shared_tier(self):
+        fragments.directory = tempfile.mkdtemp()
+        try:
+            self.client.get('/blog/')
+            fragments.clear()
+            self.client.get('/blog/')
+            self.assertEqual(fragments.stats()['shared_hits'], 2)
+        finally:
+            shutil.rmtree(fragments.directory)
+
+    def test_forget_removes_shared_files(self):
+        fragments.directory = tempfile.mkdtemp()
+        try:
+            self.client.get('/blog/')
+            fragments.forget('post', 1)
+            fragments.clear()
+            self.client.get('/blog/')
+            self.assertEqual((fragments.stats()['shared_hits'], fragments.stats()['misses']), (1, 1))
+        finally:
+            shutil.rmtree(fragments.directory)
+
+    def test_shared_tier_is_size_bounded(self):
+        fragments.directory, fragments.directory_size = tempfile.mkdtemp(), 1
+        try:
+            self.client.get('/blog/')
+            self.assertLessEqual(len(os.listdir(fragments.directory)), 1)
+        finally:
+            shutil.rmtree(fragments.directory)
+
+    def test_failing_shared_write_still_renders(self):
+        fragments.directory = tempfile.mkdtemp()
+        try:
+            # a directory where the fragment file goes makes the rename fail
+            self.client.get('/blog/')
+            paths = [os.path.join(fragments.directory, name) for name in os.listdir(fragments.directory)]
+            for path in paths:
+                os.remove(path)
+                os.mkdir(path)
+            fragments.clear()
+            response = self.client.get('/blog/')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'First', response.data)
+            self.assertEqual(fragments.stats()['misses'], 2)
+            self.assertEqual(sorted(os.path.join(fragments.directory, name) for name in os.listdir(fragments.directory)), sorted(paths))
+        finally:
+            shutil.rmtree(fragments.directory)
@@ -0,0 +1,63 @@
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db, identity
+from app.models import User, Role, Permission, load_user
+
+
+class IdentityCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        role = Role(name='Moderator', permissions=Permission.COMMENT | Permission.MODERATE)
+        db.session.add(User(username='john', email='john@example.com', password='cat', role=role))
+        db.session.commit()
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_hit_needs_no_query(self):
+        load_user('1')
+        db.session.remove()
+
+        before = len(get_debug_queries())
+        user = load_user('1')
+        self.assertEqual(user.username, 'john')
+        self.assertTrue(user.can(Permission.MODERATE))
+        self.assertFalse(user.is_administrator())
+        self.assertEqual(user.role.name, 'Moderator')
+        self.assertEqual(len(get_debug_queries()), before)
+
+    def test_invalidate(self):
+        load_user('1')
+        User.query.get(1).username = 'jack'
+        db.session.commit()
+        db.session.remove()
+
+        self.assertEqual(load_user('1').username, 'john')
+        identity.invalidate(1)
+        db.session.remove()
+        self.assertEqual(load_user('1').username, 'jack')
+
+    def test_credentials_are_not_cached(self):
+        load_user('1')
+        db.session.remove()
+        entry = identity._get(1)
+        self.assertNotIn('hashed_password', entry['user'])
+        self.assertNotIn('salt', entry['user'])
+
+        # a password changed by another process is checked against the database
+        User.query.get(1).password = 'dog'
+        db.session.commit()
+        db.session.remove()
+        before = len(get_debug_queries())
+        user = load_user('1')
+        self.assertNotIn('hashed_password', user.__dict__)
+        self.assertTrue(user.check_password('dog'))
+        self.assertFalse(user.check_password('cat'))
+        self.assertEqual(len(get_debug_queries()), before + 1)
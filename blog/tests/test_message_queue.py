@@ -0,0 +1,83 @@
+import multiprocessing
+import unittest
+from time import monotonic, sleep
+from config import config, DEFAULT_SECRET_KEY
+from app import create_app, socket_io
+from app.socket.broker import Broker, LocalPubSubManager
+
+URL = 'local://127.0.0.1:0'
+SECRET = 'message queue test key'
+
+
+def serve(broker):
+    broker.serve_forever()
+
+
+def worker(url, name, ready, go, results):
+    config['TEST'].SOCKETIO_MESSAGE_QUEUE = url
+    config['TEST'].SECRET_KEY = SECRET
+    create_app('TEST')
+    # the test client refuses message queues, so record what the server would send to a connected client instead
+    received = []
+    server = socket_io.server
+    server._send_packet = lambda sid, packet: received.append(packet.data[1]['message'])
+    server.manager_initialized = True
+    server.manager.initialize()
+    server.manager.connect(name, '/')
+    server.manager.enter_room(name, '/', 'lobby')
+    ready.set()
+    go.wait(10)
+
+    socket_io.emit('text', {'message': name}, room='lobby')
+    deadline = monotonic() + 10
+    while len(received) < 2 and monotonic() < deadline:
+        sleep(0.01)
+    results.put((name, sorted(received)))
+
+
+@unittest.skipIf(multiprocessing.get_start_method() != 'fork', 'the workers are forked from the test process')
+class MessageQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        broker = Broker(URL, SECRET.encode('utf-8'))
+        self.url = 'local://%s:%d' % broker.address
+        self.broker = multiprocessing.Process(target=serve, args=(broker,), daemon=True)
+        self.broker.start()
+        broker.listener.close()
+
+    def tearDown(self):
+        self.broker.terminate()
+
+    def test_emit_reaches_clients_of_every_worker(self):
+        go, results = multiprocessing.Event(), multiprocessing.Queue()
+        workers = []
+        for name in ('first', 'second'):
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(target=worker, args=(self.url, name, ready, go, results), daemon=True)
+            process.start()
+            self.assertTrue(ready.wait(10))
+            workers.append(process)
+
+        go.set()
+        received = dict(results.get(timeout=15) for _ in workers)
+        for process in workers:
+            process.join(5)
+        self.assertEqual(received, {'first': ['first', 'second'], 'second': ['first', 'second']})
+
+
+class BrokerSafetyTestCase(unittest.TestCase):
+
+    def test_default_secret_key_is_refused(self):
+        with self.assertRaises(ValueError):
+            Broker(URL, DEFAULT_SECRET_KEY.encode('utf-8'))
+        with self.assertRaises(ValueError):
+            LocalPubSubManager(URL, DEFAULT_SECRET_KEY.encode('utf-8'))
+
+    def test_remote_addresses_need_to_be_allowed(self):
+        with self.assertRaises(ValueError):
+            Broker('local://0.0.0.0:0', SECRET.encode('utf-8'))
+        with self.assertRaises(ValueError):
+            LocalPubSubManager('local://broker.internal:6380', SECRET.encode('utf-8'))
+        broker = Broker('local://0.0.0.0:0', SECRET.encode('utf-8'), allow_remote=True)
+        broker.listener.close()
+        self.assertEqual(LocalPubSubManager('local://localhost:6380', SECRET.encode('utf-8')).address, ('localhost', 6380))
@@ -0,0 +1,114 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from flask import g
+from sqlalchemy.exc import OperationalError
+from app import create_app, db, metrics, concurrency
+from app.metrics import Sample, LATENCY_BUCKETS, SIZE_BUCKETS
+from app.models import User, Post, Role
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        db.session.add(Post(title='First', body='Body', author=User(username='john', email='john@example.com', about_me='')))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        metrics.sample_rate = 0
+        if metrics.directory:
+            shutil.rmtree(metrics.directory)
+            metrics.directory = None
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _value(self, exposition, line):
+        match = re.search('^%s (\\S+)$' % re.escape(line), exposition, re.MULTILINE)
+        self.assertIsNotNone(match, line)
+        return float(match.group(1))
+
+    def test_unsampled_requests_are_counted_but_not_timed(self):
+        self.client.get('/blog/')
+        self.client.get('/blog/')
+        exposition = self.client.get('/metrics').get_data(as_text=True)
+
+        self.assertEqual(self._value(exposition, 'blog_request_duration_seconds_count{endpoint="blog.index_posts"}'), 2)
+        self.assertGreaterEqual(self._value(exposition, 'blog_db_queries_total{endpoint="blog.index_posts"}'), 4)
+        self.assertNotIn('blog_db_query_seconds_total{endpoint="blog.index_posts"}', exposition)
+        self.assertNotIn('blog_template_render_seconds_total{endpoint="blog.index_posts"}', exposition)
+
+    def test_sampled_and_unsampled_queries_count_alike(self):
+        self.client.get('/blog/')
+        unsampled = metrics.queries['blog.index_posts']
+        metrics.reset()
+        metrics.sample_rate = 1
+        self.client.get('/blog/')
+        self.assertEqual(metrics.queries['blog.index_posts'], unsampled)
+
+    def test_exposition(self):
+        metrics.sample_rate = 1
+        self.client.get('/blog/')
+        self.client.get('/blog/')
+        exposition = self.client.get('/metrics').get_data(as_text=True)
+
+        self.assertEqual(self._value(exposition, 'blog_request_duration_seconds_count{endpoint="blog.index_posts"}'), 2)
+        self.assertEqual(self._value(exposition, 'blog_request_duration_seconds_bucket{endpoint="blog.index_posts",le="+Inf"}'), 2)
+        self.assertGreater(self._value(exposition, 'blog_response_size_bytes_sum{endpoint="blog.index_posts"}'), 0)
+        self.assertGreaterEqual(self._value(exposition, 'blog_db_queries_total{endpoint="blog.index_posts"}'), 4)
+        self.assertGreater(self._value(exposition, 'blog_template_render_seconds_total{endpoint="blog.index_posts"}'), 0)
+        self.assertIn('blog_fragment_cache_lookups_total{result="hits"}', exposition)
+
+    def test_slow_request_log(self):
+        metrics.sample_rate, metrics.slow_request_time = 1, 0
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/blog/')
+        self.assertIn('Slow request: GET /blog/?', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_workers_are_added_up(self):
+        metrics.sample_rate, metrics.directory = 1, tempfile.mkdtemp()
+        # another worker's figures, as it wrote them
+        other = {
+            'latency': {'blog.index_posts': [[0] * len(LATENCY_BUCKETS) + [3], 30.0]},
+            'size': {'blog.index_posts': [[3] + [0] * len(SIZE_BUCKETS), 300.0]},
+            'queries': {'blog.index_posts': 12},
+            'query_time': {'blog.index_posts': 1.5},
+            'template_time': {},
+            'fragments': {'hits': 7, 'shared_hits': 0, 'misses': 1, 'size': 1},
+            'blocked': {'count': 2, 'seconds': 0.5},
+        }
+        with open(os.path.join(metrics.directory, '1-other.json'), 'w') as stream:
+            json.dump(other, stream)
+        with open(os.path.join(metrics.directory, '2-torn.json'), 'w') as stream:
+            stream.write('{"latency"')
+        self.client.get('/blog/')
+        exposition = self.client.get('/metrics').get_data(as_text=True)
+
+        self.assertEqual(self._value(exposition, 'blog_request_duration_seconds_count{endpoint="blog.index_posts"}'), 4)
+        self.assertEqual(self._value(exposition, 'blog_request_duration_seconds_bucket{endpoint="blog.index_posts",le="+Inf"}'), 4)
+        self.assertGreater(self._value(exposition, 'blog_request_duration_seconds_sum{endpoint="blog.index_posts"}'), 30)
+        self.assertGreater(self._value(exposition, 'blog_db_queries_total{endpoint="blog.index_posts"}'), 12)
+        self.assertGreaterEqual(self._value(exposition, 'blog_fragment_cache_lookups_total{result="hits"}'), 7)
+        self.assertEqual(self._value(exposition, 'blog_event_loop_blocked_total'), 2 + concurrency.blocked)
+        # this process wrote its own file
+        self.assertEqual(len([name for name in os.listdir(metrics.directory) if name.startswith('%d-' % os.getpid())]), 1)
+
+    def test_failed_statement_is_popped(self):
+        with self.app.test_request_context('/blog/'):
+            g._metrics = Sample()
+            connection = db.session.connection()
+            with self.assertRaises(OperationalError):
+                connection.execute('SELECT * FROM no_such_table')
+            connection.execute('SELECT 1')
+            self.assertEqual(connection.info.get('_metrics_started'), [])
+            self.assertEqual(g._metrics.queries, 1)
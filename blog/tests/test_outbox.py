@@ -0,0 +1,80 @@
+import unittest
+from app import create_app, db, mail, outbox
+from app.models import OutboxMessage
+from app.utils import send_mail, send_contact_mail
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class Recorder(object):
+    def __init__(self):
+        self.envelopes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        return '250 OK'
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == 'nobody@example.com':
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+
+@unittest.skipIf(Controller is None, 'aiosmtpd is not installed')
+class OutboxTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.recorder = Recorder()
+        self.smtp = Controller(self.recorder, hostname='127.0.0.1', port=8025)
+        self.smtp.start()
+        self.app = create_app('TEST')
+        self.app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=8025, MAIL_USE_TLS=False, MAIL_SUPPRESS_SEND=False)
+        mail.init_app(self.app)
+        self.app_context = self.app.test_request_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.smtp.stop()
+
+    def test_messages_are_batched_over_one_connection(self):
+        send_mail('john@example.com', 'Confirm your account', 'auth/email/confirm.html', user=None, token='token')
+        send_contact_mail('jane@example.com', 'Hello', 'Nice blog')
+        self.assertEqual(self.recorder.envelopes, [])
+
+        self.assertEqual(outbox.deliver_all(), 2)
+        self.assertEqual([envelope.rcpt_tos for envelope in self.recorder.envelopes],
+                         [['john@example.com'], ['flask@example.com']])
+        self.assertEqual(OutboxMessage.query.filter_by(status='sent').count(), 2)
+
+    def test_refused_recipient_does_not_fail_the_batch(self):
+        send_mail('john@example.com', 'Confirm your account', 'auth/email/confirm.html', user=None, token='token')
+        send_mail('nobody@example.com', 'Confirm your account', 'auth/email/confirm.html', user=None, token='token')
+        send_contact_mail('jane@example.com', 'Hello', 'Nice blog')
+
+        outbox.deliver()
+        self.assertEqual([(message.recipients, message.status, message.attempts) for message in OutboxMessage.query.order_by(OutboxMessage.id)],
+                         [('john@example.com', 'sent', 0), ('nobody@example.com', 'pending', 1), ('Flask Admin <flask@example.com>', 'sent', 0)])
+
+    def test_failures_back_off_then_dead_letter(self):
+        self.app.config['MAIL_PORT'] = 8026
+        mail.init_app(self.app)
+        send_contact_mail('jane@example.com', 'Hello', 'Nice blog')
+
+        outbox.deliver()
+        message = OutboxMessage.query.one()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertEqual(outbox.deliver(), 0)
+
+        outbox.max_attempts = 2
+        message.next_attempt_at = message.timestamp
+        db.session.commit()
+        outbox.deliver()
+        self.assertEqual(OutboxMessage.query.one().status, 'dead')
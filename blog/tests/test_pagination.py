@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import Post
+from app.pagination import KeysetPagination, encode_cursor, decode_cursor
+
+
+class KeysetPaginationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        # pairs of posts share a timestamp so the id has to break the tie
+        for index in range(10):
+            db.session.add(Post(title='Post %d' % index, timestamp=datetime(2020, 1, 1 + index // 2)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _page(self, cursor=None):
+        return KeysetPagination(Post.query, [Post.timestamp, Post.id], cursor=cursor, per_page=4, descending=True)
+
+    def test_cursor_round_trip(self):
+        values = [datetime(2020, 1, 2, 3, 4, 5, 6), 42]
+        self.assertEqual(decode_cursor(encode_cursor(values, True)), (True, values))
+        self.assertEqual(decode_cursor('not a cursor'), (False, None))
+
+    def test_walk_forward_and_back(self):
+        first = self._page()
+        self.assertEqual([post.id for post in first.items], [10, 9, 8, 7])
+        self.assertFalse(first.has_prev)
+
+        second = self._page(first.next_cursor)
+        self.assertEqual([post.id for post in second.items], [6, 5, 4, 3])
+
+        last = self._page(second.next_cursor)
+        self.assertEqual([post.id for post in last.items], [2, 1])
+        self.assertFalse(last.has_next)
+
+        back = self._page(last.prev_cursor)
+        self.assertEqual([post.id for post in back.items], [6, 5, 4, 3])
+        self.assertTrue(back.has_prev)
@@ -0,0 +1,44 @@
+import unittest
+from werkzeug.security import generate_password_hash
+from app import create_app, db, passwords
+from app.hashing import PasswordHasher
+from app.models import User, Role
+
+
+class PasswordHashingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_login_upgrades_legacy_hashes(self):
+        legacy = generate_password_hash('cat', 'pbkdf2:sha256:2')
+        db.session.add(User(username='john', email='john@example.com', confirmed=True, hashed_password=legacy))
+        db.session.commit()
+        self.assertTrue(passwords.needs_rehash(legacy))
+
+        response = self.app.test_client().post('/auth/login', data={'username': 'john', 'password': 'cat'})
+        self.assertEqual(response.status_code, 302)
+
+        hashed_password = User.query.filter_by(username='john').one().hashed_password
+        self.assertFalse(passwords.needs_rehash(hashed_password))
+        self.assertTrue(passwords.verify(hashed_password, 'cat'))
+
+    def test_process_pool(self):
+        hasher = PasswordHasher()
+        hasher.method, hasher.workers = 'pbkdf2:sha256:10', 2
+
+        hashed_password = hasher.hash('cat')
+        self.assertTrue(hashed_password.startswith('pbkdf2:sha256:10$'))
+        self.assertTrue(hasher.verify(hashed_password, 'cat'))
+        self.assertFalse(hasher.verify(hashed_password, 'dog'))
+        self.assertFalse(hasher.verify(None, 'cat'))
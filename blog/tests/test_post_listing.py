@@ -0,0 +1,45 @@
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db
+from app.models import User, Post, Role
+
+
+class PostListingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        for index in range(9):
+            user = User(username='user%d' % index, email='user%d@example.com' % index, first_name='First', last_name='Last')
+            db.session.add(Post(title='Post %d' % index, body='Body', author=user))
+        db.session.commit()
+        db.session.remove()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _count_queries(self, url):
+        before = len(get_debug_queries())
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(get_debug_queries()) - before
+
+    def test_index_posts_query_count(self):
+        # the validators of the conditional GET, then a single SELECT joining the authors
+        self.assertEqual(self._count_queries('/blog/'), 2)
+
+    def test_user_posts_query_count(self):
+        user = User.query.filter_by(username='user0').first()
+        for index in range(8):
+            db.session.add(Post(title='Other %d' % index, body='Body', author=user))
+        db.session.commit()
+        db.session.remove()
+
+        # the validators load the user and the listing version, then the posts, the profile counters are columns of the user
+        self.assertEqual(self._count_queries('/blog/user0/posts'), 3)
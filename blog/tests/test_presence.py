@@ -0,0 +1,58 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, presence
+from app.models import User, Role
+
+
+class PresenceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        db.session.add_all([User(username='user%d' % i, email='user%d@example.com' % i, password='cat') for i in range(3)])
+        db.session.commit()
+        self.start = datetime.utcnow() - timedelta(hours=1)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def last_seen(self):
+        return {user_id: seen for user_id, seen in db.session.query(User.id, User.last_seen)}
+
+    def test_pings_within_the_granularity_are_coalesced(self):
+        self.assertTrue(presence.ping(1, self.start))
+        self.assertFalse(presence.ping(1, self.start + presence.granularity / 2))
+        self.assertTrue(presence.ping(1, self.start + presence.granularity))
+        self.assertEqual(presence._dirty, {1: self.start + presence.granularity})
+
+    def test_flush_size(self):
+        presence.flush_size = 2
+        presence.ping(1, self.start)
+        self.assertNotEqual(self.last_seen()[1], self.start)
+
+        presence.ping(2, self.start)
+        self.assertEqual(presence._dirty, {})
+        self.assertEqual(self.last_seen()[1], self.start)
+        self.assertEqual(self.last_seen()[2], self.start)
+
+    def test_flush_interval(self):
+        presence.ping(1, self.start)
+        self.app.test_client().get('/blog/')
+        self.assertNotEqual(self.last_seen()[1], self.start)
+
+        # a request ending after the interval writes what is pending, without another ping
+        presence._flushed_at -= presence.flush_interval
+        self.app.test_client().get('/blog/')
+        self.assertEqual(self.last_seen()[1], self.start)
+
+    def test_dropping_the_tables_forgets_pending_times(self):
+        presence.ping(1, self.start)
+        db.drop_all()
+        self.assertEqual(presence._dirty, {})
+        self.assertIsNone(presence.app)
+        db.create_all()
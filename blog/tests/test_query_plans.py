@@ -0,0 +1,55 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, fixtures, timeline
+from app.models import User, Follow, Room, RoomUserAssociation, Message
+from query_plan import QueryPlanChecker
+
+ALLOWED_SCANS = {
+    'SELECT count(*) AS count_1 FROM (SELECT posts.': 'total of the post listing, cached for FLASKY_COUNT_CACHE_TTL',
+    'SELECT count(*) AS count_1 FROM (SELECT users.': 'total of the admin user listing, cached for FLASKY_COUNT_CACHE_TTL',
+}
+
+
+class QueryPlansTestCase(unittest.TestCase):
+    """Every endpoint must find its rows through an index once the tables grow."""
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        fixtures.exec_fixtures(users=150, posts=300, comments=600, seed=1, password='cat')
+        rng, now = random.Random(1), datetime.utcnow()
+        user_ids = [user_id for user_id, in db.session.query(User.id)]
+        db.session.execute(Follow.__table__.insert(), [
+            {'follower_id': author_id, 'followed_id': reader_id, 'timestamp': now - timedelta(minutes=rng.randint(0, 1000))}
+            for reader_id in user_ids for author_id in rng.sample(user_ids, 5) if author_id != reader_id])
+        db.session.execute(Room.__table__.insert(), [{'id': room_id, 'name': 'room %d' % room_id} for room_id in range(1, 151)])
+        db.session.execute(RoomUserAssociation.__table__.insert(), [
+            {'room_id': room_id, 'user_id': user_id} for room_id in range(1, 151) for user_id in set(rng.sample(user_ids, 3) + [2])])
+        db.session.execute(Message.__table__.insert(), [
+            {'room_id': 1 + index % 150, 'author_id': 2, 'body': 'message %d' % index} for index in range(300)])
+        db.session.commit()
+        timeline.backfill()
+
+        self.reader = User.query.get(2).username
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'username': self.reader, 'password': 'cat'})
+        self.admin = self.app.test_client()
+        self.admin.post('/auth/login', data={'username': 'admin', 'password': '123456'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_endpoints_do_not_scan_large_tables(self):
+        urls = ['/blog/', '/blog/%s/posts' % self.reader, '/blog/show/post/1', '/blog/followers/%s' % self.reader,
+                '/blog/following/%s' % self.reader, '/blog/timeline', '/auth/profile/%s' % self.reader, '/socket/rooms', '/socket/show/room/1', '/socket/room/1/messages', '/socket/online/users']
+        requests = [(self.client, url) for url in urls] + [(self.app.test_client(), '/blog/'), (self.admin, '/auth/users')]
+        for client, url in requests:
+            with QueryPlanChecker(db, min_rows=100, allowed=ALLOWED_SCANS) as checker:
+                self.assertLess(client.get(url).status_code, 400, url)
+            self.assertEqual(checker.scans(), [], url)
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from config import TestingConfig
+from app import create_app, db
+from app.models import User, Post, Role
+
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        primary, replica = ('sqlite:///' + os.path.join(self.directory, name) for name in ('primary.sqlite', 'replica.sqlite'))
+        with mock.patch.object(TestingConfig, 'SQLALCHEMY_DATABASE_URI', primary), \
+                mock.patch.object(TestingConfig, 'SQLALCHEMY_REPLICA_URIS', [replica]):
+            self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        # the replica lags behind, it has the post under its original title
+        for engine, title in ((db.engine, 'Edited'), (db.get_engine(self.app, 'replica_0'), 'Original')):
+            db.Model.metadata.create_all(engine)
+            engine.execute(Role.__table__.insert(), name='User', default=True)
+            engine.execute(User.__table__.insert(), id=1, username='john', email='john@example.com', about_me='')
+            engine.execute(Post.__table__.insert(), id=1, title=title, body='Body', author_id=1)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.get_engine(self.app).dispose()
+        db.get_engine(self.app, 'replica_0').dispose()
+        self.app_context.pop()
+        shutil.rmtree(self.directory)
+
+    def test_read_only_views_read_from_the_replica(self):
+        for url in ('/blog/', '/blog/john/posts', '/blog/show/post/1'):
+            page = self.client.get(url).get_data(as_text=True)
+            self.assertIn('Original', page)
+            self.assertNotIn('Edited', page)
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        with self.app.test_request_context():
+            db.session().use_replica = True
+            self.assertEqual(Post.query.get(1).title, 'Original')
+
+            Post.query.filter_by(id=1).update({'body': 'Changed'})
+            db.session.expire_all()
+            self.assertEqual(Post.query.get(1).title, 'Edited')
+            db.session.remove()
+
+    def test_other_views_read_from_the_primary(self):
+        with self.app.test_request_context():
+            self.assertEqual(Post.query.get(1).title, 'Edited')
+            self.assertEqual(db.session.query(Post.title).filter(Post.id == 1).with_for_update().scalar(), 'Edited')
+
+    def test_engine_options_per_bind(self):
+        self.app.config['SQLALCHEMY_BIND_ENGINE_OPTIONS'] = {'replica': {'pool_recycle': 5}, 'replica_0': {'pool_recycle': 7}}
+        connector = db.make_connector(self.app, 'replica_0')
+        options = connector.get_options(db.get_engine(self.app, 'replica_0').url, False)
+        self.assertEqual(options['pool_recycle'], 7)
+        self.assertTrue(options['pool_pre_ping'])
+        # SQLite files get a NullPool, which takes no queue sizes
+        self.assertNotIn('pool_size', options)
@@ -0,0 +1,41 @@
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, presence
+from app.models import User, Room, RoomUserAssociation
+
+
+class RoomPresenceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        now = datetime.utcnow()
+        users = [User(username='online', email='online@example.com', last_seen=now),
+                 User(username='offline', email='offline@example.com', last_seen=now - timedelta(days=1)),
+                 User(username='socket', email='socket@example.com', last_seen=now - timedelta(days=1))]
+        rooms = [Room(name='everyone'), Room(name='quiet'), Room(name='empty')]
+        rooms[0].room_users = [RoomUserAssociation(user=user) for user in users]
+        rooms[1].room_users = [RoomUserAssociation(user=users[1])]
+        db.session.add_all(rooms)
+        db.session.commit()
+
+    def tearDown(self):
+        presence.disconnect('sid')
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_counts_for_many_rooms_in_one_query(self):
+        presence.connect(3, 'sid')
+        self.assertEqual(presence.room_presence([1, 2, 3]), {1: (2, 1), 2: (0, 1), 3: (0, 0)})
+
+        presence.disconnect('sid')
+        self.assertEqual(presence.room_presence([1])[1].online, 2)
+
+    def test_members(self):
+        members = {user.username: online for user, online in presence.room_members(1)}
+        self.assertEqual(sorted(members), ['offline', 'online', 'socket'])
+        self.assertTrue(members['online'])
+        self.assertFalse(members['offline'])
@@ -0,0 +1,72 @@
+import unittest
+from app import create_app, db, search
+from app.models import User, Post, Role, Comment, Permission
+from app.pagination import encode_cursor
+
+
+class SearchIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        for index in range(5):
+            post = Post(title='Flask tip %d' % index, body='Use the <b>application</b> factory ' * (index + 1))
+            db.session.add(post)
+        db.session.add(Comment(body='Factory functions are great', post_id=1))
+        db.session.commit()
+        search.reindex(batch_size=2)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_ranked_and_paginated(self):
+        first = search.search('factory', per_page=4)
+        self.assertTrue(first.has_next)
+        second = search.search('factory', first.next_cursor, per_page=4)
+        self.assertFalse(second.has_next)
+        hits = first.items + second.items
+        self.assertEqual(len(hits), 6)
+        self.assertEqual(len([hit for hit in hits if hit.is_comment]), 1)
+        # the post repeating the term most often ranks first
+        self.assertEqual(hits[0].post_id, 5)
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        snippet = search.search('application').items[0].snippet
+        self.assertIn('<mark>application</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+    def test_incremental_updates(self):
+        post = Post.query.get(1)
+        post.title = 'Blueprints'
+        search.index_post(post)
+        self.assertEqual([hit.post_id for hit in search.search('blueprints').items], [1])
+
+        search.remove_post(1)
+        self.assertEqual(search.search('blueprints').items, [])
+
+    def test_removing_a_post_removes_its_comments(self):
+        search.remove_post(1, [1])
+        self.assertEqual(search.search('functions').items, [])
+
+    def test_foreign_cursor_reads_as_the_first_page(self):
+        first = search.search('factory', per_page=4)
+        for values in ([1], [1, 2, 3], ['a', 'b'], [True, 1]):
+            page = search.search('factory', encode_cursor(values), per_page=4)
+            self.assertEqual([hit.post_id for hit in page.items], [hit.post_id for hit in first.items])
+
+    def test_a_failing_update_is_logged_not_raised(self):
+        db.session.add(User(username='john', email='john@example.com', password='cat', about_me='',
+                            role=Role(name='User', default=True, permissions=Permission.COMMENT)))
+        Post.query.get(1).author_id = 1
+        db.session.commit()
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'john', 'password': 'cat'})
+        search._write('DROP TABLE documents', [()])
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.assertEqual(client.post('/blog/show/post/1', data={'body': 'Comment'}).status_code, 302)
+        self.assertIn('Could not update the search index', logs.output[0])
+        self.assertEqual(Comment.query.count(), 2)
@@ -0,0 +1,60 @@
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db, socket_io
+from app.socket.sessions import sessions
+from app.models import User, Room, Role, RoomUserAssociation
+
+
+class SocketSessionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        john = User(username='john', email='john@example.com', password='cat', first_name='John', last_name='Doe')
+        db.session.add_all([Room(name='lobby', room_users=[RoomUserAssociation(user=john)]), Room(name='private')])
+        db.session.commit()
+
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'username': 'john', 'password': 'cat'})
+        self.socket = socket_io.test_client(self.app, flask_test_client=self.client)
+        self.socket.get_received()
+
+    def tearDown(self):
+        self.socket.disconnect()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_events_are_authorized_without_queries(self):
+        before = len(get_debug_queries())
+        self.socket.emit('join', {'room': '1'})
+        self.socket.emit('message', {'room': '1', 'message': 'Hello'})
+        self.assertEqual(len(get_debug_queries()), before)
+
+        received = self.socket.get_received()
+        self.assertEqual(received[0]['args'][0], 'John Doe has joined the room.')
+        self.assertEqual(received[1]['args'][0]['message'], 'Hello')
+
+    def test_rooms_the_user_does_not_belong_to_are_refused(self):
+        self.socket.emit('join', {'room': '2'})
+        self.assertEqual(self.socket.get_received(), [])
+
+        # the refusal is remembered
+        before = len(get_debug_queries())
+        self.socket.emit('join', {'room': '2'})
+        self.socket.emit('message', {'room': '2', 'message': 'Hello'})
+        self.assertEqual(self.socket.get_received(), [])
+        self.assertEqual(len(get_debug_queries()), before)
+
+        # until the membership changes
+        db.session.add(RoomUserAssociation(user_id=1, room_id=2))
+        db.session.commit()
+        sessions.invalidate([1])
+        self.socket.emit('join', {'room': '2'})
+        self.assertEqual(len(self.socket.get_received()), 1)
+
+    def test_anonymous_connections_are_rejected(self):
+        self.assertFalse(socket_io.test_client(self.app).is_connected())
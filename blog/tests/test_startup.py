@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# modules a CLI command must not import, each of them only serves the web views
+WEB_ONLY = ('flask_socketio', 'socketio', 'engineio', 'flask_wtf', 'wtforms', 'flask_moment',
+            'flask_datepicker', 'flask_debugtoolbar', 'faker', 'app.main', 'app.auth', 'app.blog', 'app.socket')
+
+STARTUP = 'import sys; from app import create_app; create_app("%s", web=%s); print("\\n".join(sys.modules))'
+
+
+def startup(config_name, web):
+    """Modules imported by a fresh interpreter building the app, with the -X importtime report when available."""
+    command = [sys.executable]
+    if sys.version_info >= (3, 7):
+        command += ['-X', 'importtime']
+    completed = subprocess.run(command + ['-c', STARTUP % (config_name, web)], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), universal_newlines=True, check=True)
+    report = {}
+    for line in completed.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line and 'self [us]' not in line:
+            _, cumulative, module = line[len('import time:'):].split('|')
+            report[module.strip()] = int(cumulative)
+    return set(completed.stdout.split()), report
+
+
+class StartupTestCase(unittest.TestCase):
+
+    def test_cli_app_skips_the_web_modules(self):
+        modules, report = startup('DEV', False)
+        loaded = sorted(name for name in modules if name in WEB_ONLY or name.startswith(tuple(prefix + '.' for prefix in WEB_ONLY)))
+        slowest = sorted(report.items(), key=lambda item: item[1], reverse=True)[:10]
+        self.assertEqual(loaded, [], 'slowest imports: %s' % slowest)
+
+    def test_web_app_loads_the_views(self):
+        modules, _ = startup('TEST', True)
+        self.assertTrue({'flask_socketio', 'app.blog.views', 'app.socket.events'} <= modules)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+from flask_uploads import UploadConfiguration
+from app import create_app, thumbnails
+
+
+class ThumbnailTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from PIL import Image
+
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app('TEST')
+        self.app.upload_set_config['images'] = UploadConfiguration(self.directory)
+        self.app_context = self.app.test_request_context()
+        self.app_context.push()
+        thumbnails.cache_dir = os.path.join(self.directory, 'thumbnails')
+        Image.new('RGB', (1000, 500)).save(os.path.join(self.directory, 'image.png'))
+
+    def tearDown(self):
+        self.app_context.pop()
+        shutil.rmtree(self.directory)
+
+    def test_renditions_are_rendered_off_request(self):
+        self.assertTrue(thumbnails.url('image.png', height=250).endswith('/image.png'))
+        thumbnails.warm(['image.png'])
+
+        from PIL import Image
+
+        url = thumbnails.url('image.png', height=250)
+        self.assertTrue(url.startswith('/media/thumbnails/'))
+        with Image.open(os.path.join(thumbnails.cache_dir, url.rsplit('/', 1)[1].split('?')[0])) as image:
+            self.assertEqual(image.size, (500, 250))
+
+    def test_new_upload_under_a_reused_name_gets_new_renditions(self):
+        from PIL import Image
+
+        thumbnails.warm(['image.png'])
+        url = thumbnails.url('image.png', height=250)
+        os.remove(os.path.join(self.directory, 'image.png'))
+        Image.new('RGB', (400, 400)).save(os.path.join(self.directory, 'image.png'))
+        os.utime(os.path.join(self.directory, 'image.png'), ns=(0, 0))
+        self.assertNotEqual(thumbnails.url('image.png', height=250), url)
+
+    def test_evicted_rendition_is_rendered_again(self):
+        thumbnails.warm(['image.png'])
+        url = thumbnails.url('image.png', height=250)
+        os.remove(os.path.join(thumbnails.cache_dir, url.split('?')[0].rsplit('/', 1)[1]))
+
+        client = self.app.test_client()
+        response = client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith('/image.png'))
+        thumbnails.warm(['image.png'])
+        self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(client.get('/media/thumbnails/unknown.png?height=250&src=image.png').status_code, 404)
+
+    def test_cache_is_size_bounded(self):
+        thumbnails.cache_size = 1
+        thumbnails.warm(['image.png'])
+        self.assertLessEqual(len(os.listdir(thumbnails.cache_dir)), 1)
@@ -0,0 +1,73 @@
+import unittest
+from flask_sqlalchemy import get_debug_queries
+from app import create_app, db, timeline
+from app.models import User, Post, Follow, Role, TimelineEntry
+
+
+class TimelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        self.author = User(username='author', email='author@example.com', followers_count=1)
+        self.reader = User(username='reader', email='reader@example.com', password='cat', following_count=1)
+        db.session.add_all([self.author, self.reader])
+        db.session.flush()
+        db.session.add(Follow(follower_id=self.author.id, followed_id=self.reader.id))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _publish(self, title):
+        post = Post(title=title, body='Body', author=self.author)
+        db.session.add(post)
+        db.session.flush()
+        timeline.fan_out(post)
+        db.session.commit()
+        return post
+
+    def test_fan_out_on_write(self):
+        post = self._publish('Hello')
+        self.assertEqual(TimelineEntry.query.filter_by(user_id=self.reader.id).count(), 1)
+        self.assertEqual(timeline.paginate(self.reader, None, 10).items, [post])
+
+        timeline.unfollow(self.reader.id, self.author.id)
+        db.session.commit()
+        self.assertEqual(timeline.paginate(self.reader, None, 10).items, [])
+
+    def test_fan_out_on_read(self):
+        self.app.config['FLASKY_TIMELINE_FANOUT_LIMIT'] = 0
+        post = self._publish('Hello')
+        self.assertEqual(TimelineEntry.query.count(), 0)
+        self.assertEqual(timeline.paginate(self.reader, None, 10).items, [post])
+
+    def test_backfill(self):
+        post = self._publish('Hello')
+        TimelineEntry.query.delete()
+        timeline.backfill(batch_size=1)
+        self.assertEqual(timeline.paginate(self.reader, None, 10).items, [post])
+
+    def _queries(self, client):
+        before = len(get_debug_queries())
+        self.assertEqual(client.get('/blog/timeline').status_code, 200)
+        return len(get_debug_queries()) - before
+
+    def test_page_queries_do_not_grow_with_the_authors(self):
+        self._publish('Hello')
+        client = self.app.test_client()
+        client.post('/auth/login', data={'username': 'reader', 'password': 'cat'})
+        one_author = self._queries(client)
+
+        for index in range(4):
+            self.author = User(username='author%d' % index, email='author%d@example.com' % index, followers_count=1)
+            db.session.add(self.author)
+            db.session.flush()
+            db.session.add(Follow(follower_id=self.author.id, followed_id=self.reader.id))
+            self._publish('Hello %d' % index)
+        self.assertEqual(self._queries(client), one_author)
@@ -0,0 +1,52 @@
+import unittest
+from app import create_app, db, tokens, passwords
+from app.models import User, Role
+
+
+class TokensTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app('TEST')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(Role(name='User', default=True))
+        db.session.add(User(username='john', email='john@example.com', confirmed=True, password='cat'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        self.app.config['SECRET_KEY_FALLBACKS'] = []
+
+    def test_purpose(self):
+        token = tokens.generate('confirm', 1)
+        self.assertEqual(tokens.extract('confirm', token), 1)
+        self.assertIsNone(tokens.extract('reset', token))
+        self.assertIsNone(tokens.extract('confirm', token + 'x'))
+
+    def test_key_rotation(self):
+        token = tokens.generate('confirm', 1)
+
+        self.app.config.update(SECRET_KEY='new key', SECRET_KEY_FALLBACKS=[self.app.config['SECRET_KEY']])
+        tokens.init_app(self.app)
+        self.assertEqual(tokens.extract('confirm', token), 1)
+        self.assertNotEqual(tokens.generate('confirm', 1), token)
+
+        self.app.config['SECRET_KEY_FALLBACKS'] = []
+        tokens.init_app(self.app)
+        self.assertIsNone(tokens.extract('confirm', token))
+
+    def test_reset_tokens_cannot_be_replayed(self):
+        client = self.app.test_client()
+        token = tokens.generate('reset', 1, single_use=True)
+        self.assertEqual(client.get('/auth/account/reset/' + token).status_code, 200)
+
+        client.post('/auth/account/reset/' + token, data={'password': 'dog1', 'second_password': 'dog1'})
+        client.get('/auth/logout')
+        self.assertTrue(passwords.verify(User.query.get(1).hashed_password, 'dog1'))
+
+        response = client.post('/auth/account/reset/' + token, data={'password': 'cow1', 'second_password': 'cow1'})
+        self.assertTrue(response.headers['Location'].endswith('/auth/account/recover'))
+        self.assertTrue(passwords.verify(User.query.get(1).hashed_password, 'dog1'))
@@ -0,0 +1,31 @@
+import os
+import sys
+
+# uWSGI registers its module in sys.modules before it loads this file, there is nothing to import elsewhere
+uwsgi = sys.modules.get('uwsgi')
+if uwsgi is not None and uwsgi.opt.get('gevent'):
+    # before the app imports socket, ssl or threading, and before the master forks the workers
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import socket_io, create_app, db, concurrency, metrics
+
+app = create_app(os.getenv('FLASK_CONFIG', 'DEFAULT'))
+# the master loads the app once, the workers' figures of the previous run go with it
+metrics.clear_directory()
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    pass
+else:
+    @postfork
+    def init_worker():
+        # the app is loaded once in the master and forked, a worker must not reuse the master's
+        # connections, and the threads of the master, such as the block monitor, are not forked
+        with app.app_context():
+            db.engine.dispose()
+        concurrency.start()
+
+if __name__ == '__main__':
+    socket_io.run(app, host="0.0.0.0", port="5000", debug=True)
@@ -6,7 +6,7 @@ echo -e "Running $FLASK_CONFIG Configuration\n"
 
 if [ "$FLASK_CONFIG" = "DEV" ]; then
   echo -e "Running Development Server\n************\n"
-  exec python3 /blog/uwsgi.py
+  exec python3 /blog/wsgi.py
 
 elif [ "$FLASK_CONFIG" = "TEST" ]; then
   echo -e "Running Unit Test\n***********\n"